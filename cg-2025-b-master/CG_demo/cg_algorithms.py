@@ -25,10 +25,14 @@ def draw_line(p_list, algorithm):
             k = (y1 - y0) / (x1 - x0)
             for x in range(x0, x1 + 1):
                 result.append((x, int(y0 + k * (x - x0))))
+        return result
     elif algorithm == 'DDA':
         dx = x1 - x0
         dy = y1 - y0
         steps = max(abs(dx), abs(dy))
+        # 起点与终点重合时只有一个像素
+        if steps == 0:
+            return [(x0, y0)]
         x_inc = dx / steps
         y_inc = dy / steps
         # 当前点坐标（使用临时变量，避免修改原始起点）
@@ -187,15 +191,14 @@ def draw_ellipse(p_list):
     return [list(p) for p in unique_points]
 
 
-def draw_curve(p_list, algorithm):
+def draw_curve(p_list, algorithm, num_points_per_segment=50):
     """绘制曲线
 
     :param p_list: (list of list of int: [[x0, y0], [x1, y1], [x2, y2], ...]) 曲线的控制点坐标列表
     :param algorithm: (string) 绘制使用的算法，包括'Bezier'和'B-spline'
+    :param num_points_per_segment: (int) 每段曲线的采样点数（控制曲线平滑度）
     :return: (list of list of int: [[x_0, y_0], [x_1, y_1], ...]) 绘制结果的像素点坐标列表
     """
-    # 采样点数（控制曲线平滑度）
-    num_points_per_segment = 50  # 每段曲线的采样点
     curve_points = []
     n = len(p_list)
     # 检查控制点数量
@@ -249,8 +252,8 @@ def draw_curve(p_list, algorithm):
                     d = j
                     break
             # De Boor算法递推计算曲线点
-            # 初始化第0层（相关控制点）
-            p = [p_list[i] for i in range(d - k, d + 1)]
+            # 初始化第0层（相关控制点），复制一份，避免递推时改写传入的控制点
+            p = [list(p_list[i]) for i in range(d - k, d + 1)]
             # 递推计算k层
             for r in range(1, k + 1):
                 for j in range(r, k + 1):
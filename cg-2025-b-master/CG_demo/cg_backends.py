@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# 光栅化后端：cg_cli、cg_gui和cg_lod的绘制、变换和裁剪都通过当前后端调用
+#   reference  cg_algorithms，只依赖math的参考实现（默认）
+#   numpy      cg_vectorized，NumPy向量化实现，输出与reference逐点一致
+# 用 --backend 参数或环境变量 CG_BACKEND 选择后端；新的后端用register_backend注册，
+# 只需提供与cg_algorithms同名、同参数的函数，绘制函数可以返回列表或 (N, 2) 数组
+#
+#   python cg_backends.py diff input.txt --random 20 --items 300
+# 差分检查：用各个后端逐条执行真实的指令文件和cg_bench随机生成的指令文件，
+# 比较每次变换/裁剪后的控制点和每次saveCanvas的图像，报告不一致的像素和图元
+import sys
+import os
+import argparse
+import tempfile
+import importlib
+
+import numpy as np
+
+BACKEND_ENV = 'CG_BACKEND'
+DEFAULT_BACKEND = 'reference'
+BACKEND_FUNCTIONS = ('draw_line', 'draw_polygon', 'draw_ellipse', 'draw_curve',
+                     'translate', 'rotate', 'scale', 'clip')
+EDIT_COMMANDS = ('translate', 'rotate', 'scale', 'clip')
+MAX_REPORTED = 20  # 每个场景最多列出的不一致之处
+
+_registry = {'reference': 'cg_algorithms', 'numpy': 'cg_vectorized'}  # 名称 -> 模块名或后端对象
+_loaded = {}
+_current = None
+
+
+def register_backend(name, backend):
+    """注册后端
+
+    :param name: (string) 后端名称
+    :param backend: (string 或 object) 模块名（首次使用时导入），或提供BACKEND_FUNCTIONS中全部函数的对象
+    """
+    _registry[name] = backend
+    _loaded.pop(name, None)
+
+
+def available_backends():
+    return sorted(_registry)
+
+
+def get_backend(name=None):
+    """按名称取得后端，name为None时返回当前后端"""
+    if name is None:
+        return current_backend()
+    backend = _loaded.get(name)
+    if backend is None:
+        if name not in _registry:
+            raise ValueError(f"未知的光栅化后端: {name}（可选：{', '.join(available_backends())}）")
+        backend = _registry[name]
+        if isinstance(backend, str):
+            backend = importlib.import_module(backend)
+        missing = [func for func in BACKEND_FUNCTIONS if not callable(getattr(backend, func, None))]
+        if missing:
+            raise ValueError(f"光栅化后端 {name} 缺少函数: {', '.join(missing)}")
+        _loaded[name] = backend
+    return backend
+
+
+def set_backend(name):
+    """切换当前后端，name为None时按环境变量CG_BACKEND选择"""
+    global _current
+    _current = get_backend(name or os.environ.get(BACKEND_ENV) or DEFAULT_BACKEND)
+    return _current
+
+
+def current_backend():
+    """当前后端，首次调用时按环境变量CG_BACKEND选择"""
+    if _current is None:
+        return set_backend(None)
+    return _current
+
+
+def _pixel_set(pixels):
+    return set(map(tuple, np.asarray(pixels, np.int64).reshape(-1, 2).tolist()))
+
+
+def _execute(executor, line):
+    """执行一条指令，返回出错信息（没有出错时为None）"""
+    try:
+        executor.execute(line)
+    except Exception as e:
+        return f'{type(e).__name__}: {e}'
+    return None
+
+
+def diff_items(base, other, base_backend, other_backend):
+    """找出两个执行器中光栅化结果不同的图元
+
+    :return: (list of string) 图元ID
+    """
+    from cg_cli import draw_item
+    differing = []
+    for item_id, (item_type, p_list, algorithm, _) in base.item_dict.items():
+        if item_id not in other.item_dict or not p_list:
+            continue
+        other_p_list = other.item_dict[item_id][1]
+        if other_p_list != p_list:
+            # 控制点已不同，差异在变换/裁剪时已经报告
+            continue
+        expected = _pixel_set(draw_item(item_type, p_list, algorithm, base_backend))
+        actual = _pixel_set(draw_item(item_type, p_list, algorithm, other_backend))
+        if expected != actual:
+            differing.append(item_id)
+    return differing
+
+
+def diff_scene(commands, backends, output_root):
+    """用各个后端逐条执行同一组指令并比较结果，第一个后端作为基准
+
+    :param commands: (list of string) 指令
+    :param backends: (list of string) 后端名称
+    :param output_root: (string) 临时输出目录，每个后端使用其中的一个子目录
+    :return: (tuple) (不一致之处的列表, 比较过的图像数)
+    """
+    from PIL import Image
+    from cg_cli import CommandExecutor
+    executors = []
+    for name in backends:
+        output_dir = os.path.join(output_root, name)
+        os.makedirs(output_dir, exist_ok=True)
+        executors.append(CommandExecutor(output_dir, backend=name))
+    base = executors[0]
+    mismatches = []
+    images = 0
+    for number, line in enumerate(commands, 1):
+        args = line.split()
+        if not args:
+            continue
+        errors = [_execute(executor, line) for executor in executors]
+        for name, executor, error in zip(backends[1:], executors[1:], errors[1:]):
+            mismatch = {'line': number, 'command': args[0], 'backend': name}
+            if error != errors[0]:
+                mismatch.update(kind='error', expected=errors[0], actual=error)
+                mismatches.append(mismatch)
+            elif errors[0] is not None:
+                continue
+            elif args[0] in EDIT_COMMANDS:
+                expected = base.item_dict[args[1]][1]
+                actual = executor.item_dict[args[1]][1]
+                if expected != actual:
+                    mismatch.update(kind='points', item=args[1], expected=expected, actual=actual)
+                    mismatches.append(mismatch)
+            elif args[0] == 'saveCanvas':
+                path = args[1] + '.bmp'
+                expected = np.asarray(Image.open(os.path.join(base.output_dir, path)))
+                actual = np.asarray(Image.open(os.path.join(executor.output_dir, path)))
+                differing = (expected != actual).any(axis=2)
+                if differing.any():
+                    row, col = np.argwhere(differing)[0]
+                    mismatch.update(kind='pixels', image=path, pixels=int(differing.sum()),
+                                    first=(int(col), int(row)),
+                                    items=diff_items(base, executor, base.backend, executor.backend))
+                    mismatches.append(mismatch)
+        if args[0] == 'saveCanvas' and errors[0] is None:
+            images += 1
+    return mismatches, images
+
+
+def format_mismatch(mismatch):
+    head = f"  第{mismatch['line']}行 {mismatch['command']} [{mismatch['backend']}]"
+    if mismatch['kind'] == 'error':
+        return f"{head} 出错不一致：{mismatch['expected']} / {mismatch['actual']}"
+    if mismatch['kind'] == 'points':
+        return f"{head} 图元 {mismatch['item']} 的控制点不一致：{mismatch['expected']} / {mismatch['actual']}"
+    items = ', '.join(mismatch['items']) or '无（差异来自此前的控制点不一致或合成）'
+    return (f"{head} {mismatch['image']} 有 {mismatch['pixels']} 个像素不一致，"
+            f"第一个位于 {mismatch['first']}；光栅化不同的图元：{items}")
+
+
+def run_diff(scenes, backends):
+    """对每个场景做差分检查并打印结果
+
+    :param scenes: (list of (string, list of string)) 场景名和指令
+    :param backends: (list of string) 后端名称，第一个作为基准
+    :return: (int) 不一致之处的总数
+    """
+    total = 0
+    for name, commands in scenes:
+        with tempfile.TemporaryDirectory() as output_root:
+            mismatches, images = diff_scene(commands, backends, output_root)
+        total += len(mismatches)
+        print(f"{name}: {len(commands)} 条指令，比较 {images} 张图像，{len(mismatches)} 处不一致")
+        for mismatch in mismatches[:MAX_REPORTED]:
+            print(format_mismatch(mismatch))
+        if len(mismatches) > MAX_REPORTED:
+            print(f"  ……另有 {len(mismatches) - MAX_REPORTED} 处")
+    print(f"共 {len(scenes)} 个场景，后端 {' / '.join(backends)}：" + (f"{total} 处不一致" if total else "结果完全一致"))
+    return total
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='光栅化后端')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help='列出可用的后端')
+
+    diff_parser = commands.add_parser('diff', help='差分检查：比较各个后端执行同一指令文件的结果')
+    diff_parser.add_argument('input_files', nargs='*', help='指令文件')
+    diff_parser.add_argument('--backends', nargs='+', default=['reference', 'numpy'],
+                             help='参与比较的后端，第一个作为基准')
+    diff_parser.add_argument('--random', type=int, default=10, help='随机生成的场景数')
+    diff_parser.add_argument('--items', type=int, default=200, help='每个随机场景的图元数')
+    diff_parser.add_argument('--seed', type=int, default=0)
+    diff_parser.add_argument('--width', type=int, default=1000)
+    diff_parser.add_argument('--height', type=int, default=1000)
+
+    args = parser.parse_args(sys.argv[1:])
+    if args.command == 'list':
+        current = current_backend()
+        for name in available_backends():
+            print(('* ' if get_backend(name) is current else '  ') + name)
+    else:
+        if len(args.backends) < 2:
+            parser.error('至少需要两个后端')
+        for name in args.backends:
+            get_backend(name)
+        scenes = []
+        for path in args.input_files:
+            with open(path, 'r') as fp:
+                scenes.append((path, fp.read().splitlines()))
+        if args.random:
+            from cg_bench import PRESETS, generate_commands
+            presets = sorted(PRESETS)
+            for i in range(args.random):
+                preset = presets[i % len(presets)]
+                seed = args.seed + i
+                scenes.append((f'random/{preset}/seed={seed}',
+                               generate_commands(args.items, preset, seed, args.width, args.height)))
+        if not scenes:
+            parser.error('没有可比较的场景')
+        sys.exit(1 if run_diff(scenes, args.backends) else 0)
@@ -0,0 +1,321 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# 基准测试：生成可复现的指令文件，测量核心算法、cg_cli端到端和MyItem绘制的耗时，结果输出为JSON
+#
+#   python cg_bench.py generate out.txt --preset mixed --items 10000 --seed 0
+#   python cg_bench.py run --suites algorithms cli paint --output bench.json
+#   python cg_bench.py run --backend numpy --output bench_numpy.json
+#   python cg_bench.py compare old.json new.json
+#
+# 同一名称的结果在不同提交之间可以直接比较，吞吐量（*_per_sec）越大越好
+import sys
+import os
+import json
+import time
+import random
+import platform
+import argparse
+import subprocess
+import tempfile
+
+import numpy as np
+from cg_backends import get_backend, set_backend, available_backends
+
+# 指令文件预设：各类图元的权重、每个图元之后的变换/裁剪次数、每隔多少个图元保存一次画布
+MIXED_WEIGHTS = {'line': 4, 'polygon': 2, 'ellipse': 2, 'curve': 2}
+PRESETS = {
+    'mixed': dict(weights=MIXED_WEIGHTS),
+    'lines': dict(weights={'line': 1}),
+    'polygons': dict(weights={'polygon': 1}),
+    'ellipses': dict(weights={'ellipse': 1}),
+    'curves': dict(weights={'curve': 1}),
+    'transforms': dict(weights=MIXED_WEIGHTS, transforms_per_item=5),
+    'clips': dict(weights={'line': 1}, clips_per_item=2),
+    'saves': dict(weights=MIXED_WEIGHTS, save_every=50),
+}
+CLI_PRESETS = ('mixed', 'transforms', 'clips', 'saves')
+
+
+def generate_commands(item_count, preset='mixed', seed=0, width=1000, height=1000):
+    """生成可复现的指令序列
+
+    :param item_count: (int) 图元数量
+    :param preset: (string) PRESETS中的预设名
+    :param seed: (int) 随机数种子，相同参数总是生成相同的指令
+    :param width: (int) 画布宽度
+    :param height: (int) 画布高度
+    :return: (list of string) 指令，最后一条为saveCanvas
+    """
+    config = PRESETS[preset]
+    weights = config['weights']
+    transforms_per_item = config.get('transforms_per_item', 0)
+    clips_per_item = config.get('clips_per_item', 0)
+    save_every = config.get('save_every', 0)
+    rng = random.Random(seed)
+    types = list(weights)
+    type_weights = [weights[t] for t in types]
+
+    def point():
+        return [rng.randrange(width), rng.randrange(height)]
+
+    def near(x, y, radius):
+        return [min(width - 1, max(0, x + rng.randint(-radius, radius))),
+                min(height - 1, max(0, y + rng.randint(-radius, radius)))]
+
+    def coords(points):
+        return ' '.join(f'{x} {y}' for x, y in points)
+
+    commands = [f'resetCanvas {width} {height}']
+    saves = 0
+    for i in range(item_count):
+        if i % 16 == 0:
+            commands.append('setColor {} {} {}'.format(*(rng.randrange(256) for _ in range(3))))
+        item_id = f'item{i}'
+        item_type = rng.choices(types, type_weights)[0]
+        x, y = point()
+        radius = max(width, height) // 8
+        if item_type == 'line':
+            commands.append(f"drawLine {item_id} {coords([[x, y], near(x, y, radius)])} "
+                            f"{rng.choice(('DDA', 'Bresenham'))}")
+        elif item_type == 'polygon':
+            points = [near(x, y, radius) for _ in range(rng.randint(3, 8))]
+            commands.append(f"drawPolygon {item_id} {coords(points)} {rng.choice(('DDA', 'Bresenham'))}")
+        elif item_type == 'ellipse':
+            commands.append(f"drawEllipse {item_id} {coords([[x, y], near(x, y, radius)])}")
+        else:
+            algorithm = rng.choice(('Bezier', 'B-spline'))
+            count = rng.randint(3, 6) if algorithm == 'Bezier' else rng.randint(4, 7)
+            commands.append(f"drawCurve {item_id} {coords([near(x, y, radius) for _ in range(count)])} {algorithm}")
+        for _ in range(transforms_per_item):
+            operation = rng.choice(('translate', 'scale') if item_type == 'ellipse' else
+                                   ('translate', 'rotate', 'scale'))
+            if operation == 'translate':
+                commands.append(f"translate {item_id} {rng.randint(-50, 50)} {rng.randint(-50, 50)}")
+            elif operation == 'rotate':
+                commands.append(f"rotate {item_id} {coords([point()])} {rng.randint(-180, 180)}")
+            else:
+                commands.append(f"scale {item_id} {x} {y} {rng.uniform(0.8, 1.25):.2f}")
+        if item_type == 'line':
+            for _ in range(clips_per_item):
+                x0, y0 = point()
+                x1, y1 = near(x0, y0, radius)
+                commands.append(f"clip {item_id} {min(x0, x1)} {min(y0, y1)} {max(x0, x1)} {max(y0, y1)} "
+                                f"{rng.choice(('Cohen-Sutherland', 'Liang-Barsky'))}")
+        if save_every and (i + 1) % save_every == 0:
+            saves += 1
+            commands.append(f'saveCanvas bench{saves}')
+    commands.append('saveCanvas bench')
+    return commands
+
+
+def write_commands(path, commands):
+    with open(path, 'w') as fp:
+        fp.write('\n'.join(commands) + '\n')
+
+
+def best_of(repeat, func):
+    """运行repeat次，返回最短耗时（秒）和最后一次的返回值"""
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def algorithm_cases(rng, count, size=1000, backend=None):
+    """核心算法的测试用例：(名称, 函数, 参数列表)，backend为光栅化后端名，None时使用当前后端"""
+    alg = get_backend(backend)
+
+    def point():
+        return [rng.randrange(size), rng.randrange(size)]
+
+    def points(n):
+        return [point() for _ in range(n)]
+
+    lines = [points(2) for _ in range(count)]
+    polygons = [points(6) for _ in range(count)]
+    ellipses = [sorted(points(2)) for _ in range(count)]
+    beziers = [points(4) for _ in range(count)]
+    bsplines = [points(6) for _ in range(count)]
+    windows = [sorted(points(2)) for _ in range(count)]
+    cases = []
+    for algorithm in ('Naive', 'DDA', 'Bresenham'):
+        cases.append((f'draw_line/{algorithm}', lambda p, a=algorithm: alg.draw_line(p, a), lines))
+    for algorithm in ('DDA', 'Bresenham'):
+        cases.append((f'draw_polygon/{algorithm}', lambda p, a=algorithm: alg.draw_polygon(p, a), polygons))
+    cases.append(('draw_ellipse', alg.draw_ellipse, ellipses))
+    cases.append(('draw_curve/Bezier', lambda p: alg.draw_curve(p, 'Bezier'), beziers))
+    cases.append(('draw_curve/B-spline', lambda p: alg.draw_curve(p, 'B-spline'), bsplines))
+    cases.append(('translate', lambda p: alg.translate(p, 13, -7), polygons))
+    cases.append(('rotate', lambda p: alg.rotate(p, 500, 500, 37), polygons))
+    cases.append(('scale', lambda p: alg.scale(p, 500, 500, 1.3), polygons))
+    for algorithm in ('Cohen-Sutherland', 'Liang-Barsky'):
+        cases.append((f'clip/{algorithm}',
+                      lambda p, w, a=algorithm: alg.clip(p, w[0][0], w[0][1], w[1][0], w[1][1], a),
+                      list(zip(lines, windows))))
+    return cases
+
+
+def bench_algorithms(count=200, repeat=3, seed=0, backend=None):
+    """核心算法微基准：每个函数处理count个随机输入，取repeat次中的最短耗时"""
+    results = []
+    for name, func, inputs in algorithm_cases(random.Random(seed), count, backend=backend):
+        if name.startswith('clip/'):
+            run = lambda: [func(p, w) for p, w in inputs]
+        else:
+            run = lambda: [func(p) for p in inputs]
+        seconds, outputs = best_of(repeat, run)
+        result = {'suite': 'algorithms', 'name': name, 'calls': len(inputs), 'seconds': seconds,
+                  'calls_per_sec': len(inputs) / seconds}
+        if name.startswith('draw_'):
+            pixels = sum(len(output) for output in outputs)
+            result.update(pixels=pixels, pixels_per_sec=pixels / seconds)
+        results.append(result)
+    return results
+
+
+def bench_cli(item_count=2000, repeat=1, seed=0, presets=CLI_PRESETS, backend=None):
+    """cg_cli端到端：在子进程中运行各个预设生成的指令文件，包含解释器启动、解析、合成和写出BMP"""
+    results = []
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cg_cli.py')
+    options = ['--backend', backend] if backend else []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for preset in presets:
+            commands = generate_commands(item_count, preset, seed)
+            input_file = os.path.join(work_dir, preset + '.txt')
+            write_commands(input_file, commands)
+            output_dir = os.path.join(work_dir, preset)
+            seconds, _ = best_of(repeat, lambda: subprocess.run(
+                [sys.executable, script, input_file, output_dir] + options, check=True))
+            results.append({'suite': 'cli', 'name': f'cg_cli/{preset}', 'items': item_count,
+                            'commands': len(commands), 'saves': sum(c.startswith('saveCanvas') for c in commands),
+                            'seconds': seconds, 'commands_per_sec': len(commands) / seconds})
+    return results
+
+
+def bench_paint(item_count=2000, repeat=3, seed=0, backend=None):
+    """MyItem离屏绘制：首次绘制（含光栅化）、缓存命中后的重绘、缩小到1/8时的LOD绘制"""
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    if backend:
+        set_backend(backend)
+    from PyQt5.QtWidgets import QApplication, QStyleOptionGraphicsItem
+    from PyQt5.QtGui import QImage, QPainter
+    import cg_gui
+
+    app = QApplication.instance() or QApplication([])  # noqa: F841 绘制前必须存在QApplication
+    rng = random.Random(seed)
+    items = []
+    for command in generate_commands(item_count, 'mixed', seed):
+        args = command.split(' ')
+        if not args[0].startswith('draw'):
+            continue
+        item_type = args[0][4:].lower()
+        values = args[2:] if item_type == 'ellipse' else args[2:-1]
+        p_list = [[int(values[j]), int(values[j + 1])] for j in range(0, len(values), 2)]
+        algorithm = '' if item_type == 'ellipse' else args[-1]
+        items.append(cg_gui.MyItem(args[1], item_type, p_list, algorithm, (rng.randrange(256), 0, 0)))
+    image = QImage(1000, 1000, QImage.Format_RGB32)
+    option = QStyleOptionGraphicsItem()
+
+    def paint(scale):
+        image.fill(0xffffffff)
+        painter = QPainter(image)
+        painter.scale(scale, scale)
+        for item in items:
+            item.paint(painter, option)
+        painter.end()
+
+    results = []
+    start = time.perf_counter()
+    paint(1.0)
+    cold = time.perf_counter() - start
+    warm, _ = best_of(repeat, lambda: paint(1.0))
+    paint(0.125)
+    lod, _ = best_of(repeat, lambda: paint(0.125))
+    for name, seconds in (('MyItem.paint/cold', cold), ('MyItem.paint/cached', warm), ('MyItem.paint/lod3', lod)):
+        results.append({'suite': 'paint', 'name': name, 'items': len(items), 'seconds': seconds,
+                        'items_per_sec': len(items) / seconds})
+    return results
+
+
+def environment():
+    """运行环境信息，便于跨提交对比时确认条件一致"""
+    info = {'python': platform.python_version(), 'platform': platform.platform(),
+            'numpy': np.__version__, 'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+    try:
+        info['commit'] = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                        cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        pass
+    return info
+
+
+def compare(old_path, new_path, threshold=0.1):
+    """按名称对比两次结果的耗时，打印变化比例，返回变慢超过threshold的名称"""
+    with open(old_path) as fp:
+        old = {r['name']: r for r in json.load(fp)['results']}
+    with open(new_path) as fp:
+        new = {r['name']: r for r in json.load(fp)['results']}
+    regressions = []
+    for name, result in new.items():
+        if name not in old:
+            continue
+        ratio = result['seconds'] / old[name]['seconds']
+        mark = ''
+        if ratio > 1 + threshold:
+            mark = '  <-- 变慢'
+            regressions.append(name)
+        print(f"{name:32s} {old[name]['seconds']:10.4f}s -> {result['seconds']:10.4f}s  x{ratio:.2f}{mark}")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='cg_algorithms / cg_cli / cg_gui 基准测试')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate_parser = commands.add_parser('generate', help='生成指令文件')
+    generate_parser.add_argument('output', help='指令文件路径')
+    generate_parser.add_argument('--preset', choices=sorted(PRESETS), default='mixed')
+    generate_parser.add_argument('--items', type=int, default=1000, help='图元数量')
+    generate_parser.add_argument('--seed', type=int, default=0)
+    generate_parser.add_argument('--width', type=int, default=1000)
+    generate_parser.add_argument('--height', type=int, default=1000)
+
+    run_parser = commands.add_parser('run', help='运行基准测试')
+    run_parser.add_argument('--suites', nargs='+', choices=('algorithms', 'cli', 'paint'),
+                            default=['algorithms', 'cli', 'paint'])
+    run_parser.add_argument('--items', type=int, default=2000, help='cli和paint基准的图元数量')
+    run_parser.add_argument('--calls', type=int, default=200, help='算法基准每个函数的调用次数')
+    run_parser.add_argument('--repeat', type=int, default=3, help='重复次数，取最短耗时（cli基准只运行一次）')
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--backend', choices=available_backends(),
+                            help='光栅化后端，默认由环境变量CG_BACKEND指定；结果名称不含后端，可以直接对比')
+    run_parser.add_argument('--output', help='JSON结果路径，默认输出到标准输出')
+
+    compare_parser = commands.add_parser('compare', help='对比两次结果')
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=0.1, help='耗时增加超过该比例视为变慢')
+
+    args = parser.parse_args(sys.argv[1:])
+    if args.command == 'generate':
+        write_commands(args.output, generate_commands(args.items, args.preset, args.seed, args.width, args.height))
+    elif args.command == 'run':
+        results = []
+        if 'algorithms' in args.suites:
+            results += bench_algorithms(args.calls, args.repeat, args.seed, args.backend)
+        if 'cli' in args.suites:
+            results += bench_cli(args.items, 1, args.seed, backend=args.backend)
+        if 'paint' in args.suites:
+            results += bench_paint(args.items, args.repeat, args.seed, args.backend)
+        report = json.dumps({'environment': environment(), 'parameters': vars(args), 'results': results},
+                            ensure_ascii=False, indent=2)
+        if args.output:
+            with open(args.output, 'w') as fp:
+                fp.write(report + '\n')
+        else:
+            print(report)
+    else:
+        sys.exit(1 if compare(args.old, args.new, args.threshold) else 0)
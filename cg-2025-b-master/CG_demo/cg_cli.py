@@ -3,140 +3,270 @@
 
 import sys
 import os
-import cg_algorithms as alg
+import time
+import json
+import argparse
 import numpy as np
 from PIL import Image
+from cg_backends import get_backend, current_backend, available_backends, BACKEND_ENV
+from cg_tiles import TiledCanvas, DEFAULT_TILE_SIZE
+from cg_scene import save_scene, load_scene, SNAPSHOT_EXT
+
+MAX_DENSE_SIZE = 1000  # 指令规范中画布宽高的上限，超过时自动切换为大画布模式
+
+
+def draw_item(item_type, p_list, algorithm, backend=None):
+    """调用光栅化后端生成图元的像素点
+
+    :param item_type: (string) 图元类型：line/polygon/ellipse/curve
+    :param p_list: (list of list of int) 图元参数
+    :param algorithm: (string) 绘制算法，椭圆为 ""
+    :param backend: (module) 光栅化后端，为None时使用当前后端
+    :return: (list of list of int 或 numpy.ndarray) 像素点坐标
+    """
+    if backend is None:
+        backend = current_backend()
+    if item_type == 'line':
+        return backend.draw_line(p_list, algorithm)
+    elif item_type == 'polygon':
+        return backend.draw_polygon(p_list, algorithm)
+    elif item_type == 'ellipse':
+        return backend.draw_ellipse(p_list)
+    elif item_type == 'curve':
+        return backend.draw_curve(p_list, algorithm)
+    return []
+
+
+def composite(canvas, items, height, offset=(0, 0), draw=draw_item, flip_y=False, rasterized=False):
+    """把图元依次合成到画布上，cg_cli的saveCanvas、GUI的光栅合成缓冲区和导出都使用这一合成器
+
+    画布以左上角为坐标原点，纵坐标y画在第y行，与GUI的场景坐标一致
+    :param canvas: (numpy.ndarray 或 TiledCanvas) 目标画布
+    :param items: (iterable of [类型, 控制点, 算法, 颜色]) 图元；rasterized为True时为已光栅化的 (像素坐标, 颜色)
+    :param height: (int) 画布高度，flip_y为True时用于转换纵坐标
+    :param offset: (tuple of int: (row, col)) canvas左上角在整张画布中的行列位置，只合成局部区域时使用
+    :param draw: (callable) 光栅化函数，参数与draw_item相同，剖析时替换为计时版本
+    :param flip_y: (bool) 为True时纵坐标y画在第height-1-y行（早期Pillow以左下角为原点时的写法）
+    :param rasterized: (bool) items是否已经光栅化（例如GUI图元缓存的像素），为True时不调用draw
+    """
+    for item in items:
+        if rasterized:
+            pixels, color = item
+        else:
+            item_type, p_list, algorithm, color = item
+            # 加入图元已经被裁剪等原因导致点集合为空特判
+            if not p_list:
+                continue
+            pixels = draw(item_type, p_list, algorithm)
+        if len(pixels) == 0:
+            continue
+        xs, ys = np.asarray(pixels, dtype=np.int64).reshape(-1, 2).T
+        rows = (height - 1 - ys if flip_y else ys) - offset[0]
+        xs = xs - offset[1]
+        if isinstance(canvas, TiledCanvas):
+            canvas.draw_pixels(rows, xs, color)
+        else:
+            # 丢弃画布外的像素，避免负下标回绕到画布另一侧
+            inside = (rows >= 0) & (rows < canvas.shape[0]) & (xs >= 0) & (xs < canvas.shape[1])
+            canvas[rows[inside], xs[inside]] = color
+
+
+class CommandExecutor:
+    """指令执行器：维护图元字典、画笔颜色和画布尺寸，逐条执行指令"""
+    def __init__(self, output_dir, large_canvas=False, tile_size=DEFAULT_TILE_SIZE, tile_images=False,
+                 profiler=None, backend=None):
+        self.output_dir = output_dir
+        self.large_canvas = large_canvas  # 是否强制使用大画布模式
+        self.tile_size = tile_size        # 大画布模式的块边长
+        self.tile_images = tile_images    # 大画布模式下是否额外输出每个块的图像
+        self.profiler = profiler          # cg_profile.Profiler，为None时不做任何统计
+        self.backend = get_backend(backend)  # 光栅化后端，为None时使用当前后端
+        self.item_dict = {}
+        self.pen_color = np.zeros(3, np.uint8)
+        self.width = 0
+        self.height = 0
+
+    def run(self, input_file):
+        """从文件中读取并执行全部命令"""
+        with open(input_file, 'r') as fp:
+            if self.profiler is None:
+                for line in fp:
+                    self.execute(line)
+                return
+            profiler = self.profiler
+            run_start = time.perf_counter()
+            for line in fp:
+                start = time.perf_counter()
+                self.execute(line)
+                profiler.record_command(line.split(' ', 1)[0].strip(), time.perf_counter() - start)
+            profiler.total_seconds += time.perf_counter() - run_start
+
+    def execute(self, line):
+        """执行一条命令"""
+        # 将命令按照空格分割参数
+        line = line.strip().split(' ')
+        # 读取命令的内容，按照不同情况处理
+        if line[0] == 'resetCanvas':
+            self.width = int(line[1])
+            self.height = int(line[2])
+            self.item_dict = {}
+        # 绘制在这个分支里
+        # 其他的分支只是保存图元对象
+        elif line[0] == 'saveCanvas':
+            self.save_canvas(line[1])
+        elif line[0] == 'setColor':
+            self.pen_color[0] = int(line[1])
+            self.pen_color[1] = int(line[2])
+            self.pen_color[2] = int(line[3])
+        # 场景快照：保存/恢复图元、画布尺寸和画笔颜色，快照文件位于输出目录
+        elif line[0] == 'saveScene':
+            # 命令格式: saveScene name
+            save_scene(os.path.join(self.output_dir, line[1] + SNAPSHOT_EXT),
+                       self.item_dict, self.width, self.height, self.pen_color)
+        elif line[0] == 'loadScene':
+            # 命令格式: loadScene name
+            self.item_dict, self.width, self.height, self.pen_color = \
+                load_scene(os.path.join(self.output_dir, line[1] + SNAPSHOT_EXT))
+        elif line[0] == 'drawLine':
+            item_id = line[1]
+            x0 = int(line[2])
+            y0 = int(line[3])
+            x1 = int(line[4])
+            y1 = int(line[5])
+            algorithm = line[6]
+            self.item_dict[item_id] = ['line', [[x0, y0], [x1, y1]], algorithm, np.array(self.pen_color)]
+        elif line[0] == 'drawPolygon':
+            item_id = line[1]
+            dots = []
+            sizeofargs = len(line)
+            for i in range(2, sizeofargs - 1, 2):
+                dots.append([int(line[i]), int(line[i + 1])])
+            algorithm = line[sizeofargs - 1]
+            self.item_dict[item_id] = ['polygon', dots, algorithm, np.array(self.pen_color)]
+        elif line[0] == 'drawEllipse':
+            item_id = line[1]
+            x0 = int(line[2])
+            y0 = int(line[3])
+            x1 = int(line[4])
+            y1 = int(line[5])
+            self.item_dict[item_id] = ['ellipse', [[x0, y0], [x1, y1]], "", np.array(self.pen_color)]
+        elif line[0] == 'drawCurve':
+            # 命令格式: drawCurve id x0 y0 x1 y1 x2 y2 ... algorithm
+            item_id = line[1]
+            dots = []
+            sizeofargs = len(line)
+            # 提取控制点坐标（从索引2开始，到倒数第二个元素结束，步长2）
+            for i in range(2, sizeofargs - 1, 2):
+                dots.append([int(line[i]), int(line[i + 1])])
+            algorithm = line[sizeofargs - 1]
+            self.item_dict[item_id] = ['curve', dots, algorithm, np.array(self.pen_color)]
+        # 存储平移参数：类型、偏移量
+        elif line[0] == 'translate':
+            # 命令格式: translate id dx dy
+            item_id = line[1]
+            dx = int(line[2])
+            dy = int(line[3])
+            item_type, p_list, algorithm, color = self.item_dict[item_id]
+            pixels = self.backend.translate(p_list, dx, dy)
+            self.item_dict[item_id] = [item_type, pixels, algorithm, color]
+        # 存储旋转参数：类型、旋转中心、角度
+        elif line[0] == 'rotate':
+            # 命令格式: rotate id x y r
+            item_id = line[1]
+            x = int(line[2])
+            y = int(line[3])
+            r = int(line[4])
+            item_type, p_list, algorithm, color = self.item_dict[item_id]
+            pixels = self.backend.rotate(p_list, x, y, r)
+            self.item_dict[item_id] = [item_type, pixels, algorithm, color]
+        # 存储缩放参数：类型、缩放中心、比例
+        elif line[0] == 'scale':
+            # 命令格式: scale id x y s
+            item_id = line[1]
+            x = int(line[2])
+            y = int(line[3])
+            s = float(line[4])
+            item_type, p_list, algorithm, color = self.item_dict[item_id]
+            pixels = self.backend.scale(p_list, x, y, s)
+            self.item_dict[item_id] = [item_type, pixels, algorithm, color]
+        # 存储裁剪参数：类型、窗口坐标、算法
+        elif line[0] == 'clip':
+            # 命令格式: clip id x0 y0 x1 y1 algorithm
+            item_id = line[1]
+            x0 = int(line[2])   # 裁剪窗口左上角x
+            y0 = int(line[3])   # 裁剪窗口左上角y
+            x1 = int(line[4])   # 裁剪窗口右下角x
+            y1 = int(line[5])   # 裁剪窗口右下角y
+            item_type, p_list, algorithm, color = self.item_dict[item_id]
+            # 裁剪算法由指令指定，图元保留原来的绘制算法；已被完全裁掉的线段不再处理
+            if p_list:
+                p_list = self.backend.clip(p_list, x0, y0, x1, y1, line[6])
+            self.item_dict[item_id] = [item_type, p_list, algorithm, color]
+
+    def draw_item(self, item_type, p_list, algorithm):
+        """用执行器的后端光栅化图元"""
+        return draw_item(item_type, p_list, algorithm, self.backend)
+
+    def use_tiles(self):
+        """是否使用分块的大画布"""
+        return self.large_canvas or self.width > MAX_DENSE_SIZE or self.height > MAX_DENSE_SIZE
+
+    def save_canvas(self, save_name):
+        """合成全部图元并保存为 save_name.bmp"""
+        # 注意到图元的参数为：类型，控制点，算法，颜色
+        # 不存在多余算法的被保存为 ""
+        path = os.path.join(self.output_dir, save_name + '.bmp')
+        draw = self.draw_item if self.profiler is None else self.profiler.timed_draw(self.draw_item)
+        start = time.perf_counter()
+        if self.use_tiles():
+            # 大画布：只分配被图元触及的块，逐块带流式写出
+            with TiledCanvas(self.width, self.height, self.tile_size) as canvas:
+                composite(canvas, self.item_dict.values(), self.height, draw=draw)
+                composited = time.perf_counter()
+                canvas.save_bmp(path)
+                if self.tile_images:
+                    canvas.save_tiles(os.path.join(self.output_dir, save_name + '_tiles'), save_name)
+                canvas_bytes = canvas.nbytes
+        else:
+            canvas = np.zeros([self.height, self.width, 3], np.uint8)
+            canvas.fill(255)
+            composite(canvas, self.item_dict.values(), self.height, draw=draw)
+            composited = time.perf_counter()
+            Image.fromarray(canvas).save(path, 'bmp')
+            canvas_bytes = canvas.nbytes
+        if self.profiler is not None:
+            self.profiler.record_save(save_name, draw.calls, canvas_bytes,
+                                      composited - start, time.perf_counter() - composited)
 
 
 if __name__ == '__main__':
     # 读取命令行的参数
-    input_file = sys.argv[1]
-    output_dir = sys.argv[2]
-    os.makedirs(output_dir, exist_ok=True)
-
-    item_dict = {}
-    pen_color = np.zeros(3, np.uint8)
-    width = 0
-    height = 0
-
-    with open(input_file, 'r') as fp:
-        # 从文件中读取命令
-        line = fp.readline()
-        while line:
-            # 将命令按照空格分割参数
-            line = line.strip().split(' ')
-            # 读取命令的内容，按照不同情况处理
-            if line[0] == 'resetCanvas':
-                width = int(line[1])
-                height = int(line[2])
-                item_dict = {}
-            # 绘制在这个分支里
-            # 其他的分支只是保存图元对象
-            # 未填写完整
-            elif line[0] == 'saveCanvas':
-                save_name = line[1]
-                canvas = np.zeros([height, width, 3], np.uint8)
-                canvas.fill(255)
-                # 注意到此处的参数为：类型，控制点，算法，颜色
-                # 不存在多余算法的被保存为 ""
-                for item_type, p_list, algorithm, color in item_dict.values():
-                    # 加入图元已经被裁剪等原因导致点集合为空特判
-                    if not p_list:
-                        continue
-                    if item_type == 'line':
-                        pixels = alg.draw_line(p_list, algorithm)
-                        for x, y in pixels:
-                            canvas[height - 1 - y, x] = color  # 根据Pillow版本而定，最终输出的视觉结果需要以画布左上角为坐标原点
-                    elif item_type == 'polygon':
-                        pixels = alg.draw_polygon(p_list, algorithm)
-                        for x, y in pixels:
-                            canvas[height - 1 - y, x] = color
-                    elif item_type == 'ellipse':
-                        pixels = alg.draw_ellipse(p_list)
-                        for x, y in pixels:
-                            canvas[height - 1 - y, x] = color
-                    elif item_type == 'curve':
-                        pixels = alg.draw_curve(p_list, algorithm)
-                        for x, y in pixels:
-                            canvas[height - 1 - y, x] = color
-                Image.fromarray(canvas).save(os.path.join(output_dir, save_name + '.bmp'), 'bmp')
-            elif line[0] == 'setColor':
-                pen_color[0] = int(line[1])
-                pen_color[1] = int(line[2])
-                pen_color[2] = int(line[3])
-            elif line[0] == 'drawLine':
-                item_id = line[1]
-                x0 = int(line[2])
-                y0 = int(line[3])
-                x1 = int(line[4])
-                y1 = int(line[5])
-                algorithm = line[6]
-                item_dict[item_id] = ['line', [[x0, y0], [x1, y1]], algorithm, np.array(pen_color)]
-            elif line[0] == 'drawPolygon':
-                item_id = line[1]
-                dots = []
-                sizeofargs = len(line)
-                for i in range(2, sizeofargs - 1, 2):
-                    dots.append([int(line[i]), int(line[i + 1])])
-                algorithm = line[sizeofargs - 1]
-                item_dict[item_id] = ['polygon', dots, algorithm, np.array(pen_color)]        
-            elif line[0] == 'drawEllipse':
-                item_id = line[1]
-                x0 = int(line[2])
-                y0 = int(line[3])
-                x1 = int(line[4])
-                y1 = int(line[5])
-                item_dict[item_id] = ['ellipse', [[x0, y0], [x1, y1]], "", np.array(pen_color)]
-            elif line[0] == 'drawCurve':
-                # 命令格式: drawCurve id x0 y0 x1 y1 x2 y2 ... algorithm
-                item_id = line[1]
-                dots = []
-                sizeofargs = len(line)
-                # 提取控制点坐标（从索引2开始，到倒数第二个元素结束，步长2）
-                for i in range(2, sizeofargs - 1, 2):
-                    dots.append([int(line[i]), int(line[i + 1])])
-                algorithm = line[sizeofargs - 1]
-                item_dict[item_id] = ['curve', dots, algorithm, np.array(pen_color)]
-            # 存储平移参数：类型、偏移量
-            elif line[0] == 'translate':
-                # 命令格式: translate id dx dy
-                item_id = line[1]
-                dx = int(line[2])
-                dy = int(line[3])
-                item_type, p_list, algorithm, color = item_dict[item_id]
-                pixels = alg.translate(p_list, dx, dy)
-                item_dict[item_id] = [item_type, pixels, algorithm, color]
-            # 存储旋转参数：类型、旋转中心、角度
-            elif line[0] == 'rotate':
-                # 命令格式: rotate id x y r
-                item_id = line[1]
-                x = int(line[2])
-                y = int(line[3])
-                r = int(line[4])
-                item_type, p_list, algorithm, color = item_dict[item_id]
-                pixels = alg.rotate(p_list, x, y, r)
-                item_dict[item_id] = [item_type, pixels, algorithm, color]
-            # 存储缩放参数：类型、缩放中心、比例
-            elif line[0] == 'scale':
-                # 命令格式: scale id x y s
-                item_id = line[1]
-                x = int(line[2])
-                y = int(line[3])
-                s = float(line[4])
-                item_type, p_list, algorithm, color = item_dict[item_id]
-                pixels = alg.scale(p_list, x, y, s)
-                item_dict[item_id] = [item_type, pixels, algorithm, color]
-            # 存储裁剪参数：类型、窗口坐标、算法
-            elif line[0] == 'clip':
-                # 命令格式: clip id x0 y0 x1 y1 algorithm
-                item_id = line[1]
-                x0 = int(line[2])   # 裁剪窗口左上角x
-                y0 = int(line[3])   # 裁剪窗口左上角y
-                x1 = int(line[4])   # 裁剪窗口右下角x
-                y1 = int(line[5])   # 裁剪窗口右下角y
-                item_type, p_list, algorithm, color = item_dict[item_id]
-                pixels = alg.clip(p_list, x0, y0, x1, y1, algorithm)
-                item_dict[item_id] = [item_type, pixels, algorithm, color]
-            # 读取下一个命令
-            line = fp.readline()
+    parser = argparse.ArgumentParser(description='读取指令文件绘制图形并保存图像')
+    parser.add_argument('input_file', help='指令文件路径')
+    parser.add_argument('output_dir', help='图像保存目录')
+    parser.add_argument('--large-canvas', action='store_true',
+                        help=f'使用分块的大画布（宽或高超过{MAX_DENSE_SIZE}时自动启用）')
+    parser.add_argument('--tile-size', type=int, default=DEFAULT_TILE_SIZE, help='大画布模式的块边长')
+    parser.add_argument('--tile-images', action='store_true', help='大画布模式下额外输出每个块的图像')
+    parser.add_argument('--backend', choices=available_backends(),
+                        help=f'光栅化后端，默认由环境变量{BACKEND_ENV}指定，未指定时为reference')
+    parser.add_argument('--profile', action='store_true',
+                        help='统计各指令、各类图元和图像写出的耗时，结果写入输出目录的profile.json并打印摘要')
+    parser.add_argument('--profile-draw', action='store_true',
+                        help='配合--profile，用cProfile记录draw_*调用内部的耗时（开销较大）')
+    args = parser.parse_args(sys.argv[1:])
+    os.makedirs(args.output_dir, exist_ok=True)
 
+    profiler = None
+    if args.profile:
+        from cg_profile import Profiler
+        profiler = Profiler(profile_draw=args.profile_draw)
+    executor = CommandExecutor(args.output_dir, args.large_canvas, args.tile_size, args.tile_images, profiler,
+                               args.backend)
+    executor.run(args.input_file)
+    if profiler is not None:
+        with open(os.path.join(args.output_dir, 'profile.json'), 'w') as fp:
+            json.dump(profiler.report(), fp, ensure_ascii=False, indent=2)
+        if profiler.draw_profile is not None:
+            profiler.draw_profile.dump_stats(os.path.join(args.output_dir, 'profile_draw.prof'))
+        print(profiler.summary())
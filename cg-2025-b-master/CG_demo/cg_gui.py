@@ -2,25 +2,62 @@
 # -*- coding:utf-8 -*-
 
 import sys
+import os
+import gc
 import math
-import cg_algorithms as alg
+import time
+import cg_scene
+from cg_index import GridIndex
+from cg_history import EditJournal, ItemRecord, qtransform_matrix
+from cg_lod import lod_level, lod_pixels
+import numpy as np
+from PIL import Image
 from typing import Optional, List, Tuple
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QGraphicsScene, QGraphicsView,
-    QGraphicsItem, QListWidget, QHBoxLayout, QVBoxLayout, QWidget,
+    QGraphicsItem, QListView, QHBoxLayout, QVBoxLayout, QWidget,
     QPushButton, QComboBox, QLineEdit, QLabel, QColorDialog, QFileDialog,
-    QStyleOptionGraphicsItem, QStatusBar
+    QStyleOptionGraphicsItem, QStatusBar, QAction, QProgressBar, QDialog, QDialogButtonBox,
+    QFormLayout, QCheckBox
 )
-from PyQt5.QtGui import QPainter, QMouseEvent, QColor, QPen, QImage, QPixmap
-from PyQt5.QtCore import QRectF, Qt, QPointF
+from PyQt5.QtGui import (
+    QPainter, QMouseEvent, QWheelEvent, QColor, QPen, QImage, QPixmap, QPolygon, QTransform, QKeySequence
+)
+from PyQt5.QtCore import (
+    QRectF, Qt, QPointF, QPoint, QTimer, QObject, QThread, QAbstractListModel, QModelIndex, pyqtSignal
+)
+from cg_cli import draw_item, composite, CommandExecutor
+from cg_backends import current_backend, set_backend
+
+PICK_TOLERANCE = 3  # 点选图元时允许的像素距离
+LOAD_TIME_SLICE = 0.015  # 加载指令文件时每次空闲回调最多占用的时间（秒）
+LOAD_REPAINT_INTERVAL = 0.5  # 加载期间画布的最短重绘间隔（秒）
+LOAD_REPAINT_BACKOFF = 4  # 加载期间两次重绘至少相隔上一次重绘耗时的这么多倍，重绘最多占加载时间的1/5
+ZOOM_STEP = 1.25  # 滚轮每格的缩放倍数
+MIN_ZOOM = 1 / 256
+MAX_ZOOM = 64
+EXPORT_BATCH = 256  # 导出时每合成这么多个图元报告一次进度、检查一次取消
+EXPORT_FORMATS = ('bmp', 'png', 'jpg')
+PREVIEW_TYPES = ('line', 'ellipse')  # 两点即可确定、绘制过程中实时预览的图元类型
 
 
 class MyItem(QGraphicsItem):
-    """自定义图元类，支持多种图元类型绘制"""
+    """自定义图元类，支持多种图元类型绘制
+
+    光栅化结果缓存为QPolygon，只在p_list或algorithm被重新赋值时失效，
+    颜色由画笔决定，改色只需重绘；原地修改p_list后需调用invalidate()。
+    缩小显示时按LOD等级另外缓存简化后的光栅，不足一个屏幕像素的图元画成一个点。
+    控制点不足以光栅化的图元（如少于4个控制点的B样条曲线）没有像素，paint中不能抛出异常，否则PyQt会终止进程
+    """
     def __init__(self, item_id: str, item_type: str, p_list: list, 
                  algorithm: str = '', color: Tuple[int, int, int] = (0, 0, 0), 
                  parent: QGraphicsItem = None):
         super().__init__(parent)
+        self._pixels = None         # 像素坐标缓存 (N, 2)
+        self._raster = None         # 像素缓存
+        self._lod_rasters = {}      # LOD等级 -> 缩小坐标系中的像素缓存
+        self._bounding_rect = None  # 边界缓存
+        self.serial = 0             # 添加顺序，越大越靠上
         self.id = item_id           # 图元ID
         self.item_type = item_type  # 图元类型：line/polygon/ellipse/curve
         self.p_list = p_list        # 顶点/控制点列表
@@ -28,37 +65,416 @@ class MyItem(QGraphicsItem):
         self.color = color          # 颜色(RGB)
         self.selected = False       # 是否选中
 
+    @property
+    def p_list(self) -> list:
+        return self._p_list
+
+    @p_list.setter
+    def p_list(self, p_list: list):
+        self._p_list = p_list
+        self.invalidate()
+
+    @property
+    def algorithm(self) -> str:
+        return self._algorithm
+
+    @algorithm.setter
+    def algorithm(self, algorithm: str):
+        self._algorithm = algorithm
+        self.invalidate()
+
+    @property
+    def color(self) -> Tuple[int, int, int]:
+        return self._color
+
+    @color.setter
+    def color(self, color: Tuple[int, int, int]):
+        self._color = color
+        self.update()
+
+    def invalidate(self):
+        """丢弃像素缓存，下次绘制时重新光栅化"""
+        self.prepareGeometryChange()
+        self._pixels = None
+        self._raster = None
+        self._lod_rasters = {}
+        self._bounding_rect = None
+
+    def pixels(self) -> np.ndarray:
+        """返回图元光栅化后的像素坐标数组（有缓存时直接复用）"""
+        if self._pixels is None:
+            try:
+                pixels = draw_item(self.item_type, self.p_list, self.algorithm) if self.p_list else []
+            except ValueError:
+                pixels = []
+            self._pixels = np.array(pixels, dtype=np.int64).reshape(-1, 2)
+        return self._pixels
+
+    def raster(self) -> QPolygon:
+        """返回用于绘制的像素点（有缓存时直接复用）"""
+        if self._raster is None:
+            self._raster = QPolygon([QPoint(x, y) for x, y in self.pixels().tolist()])
+        return self._raster
+
+    def lod_raster(self, level: int) -> QPolygon:
+        """返回LOD等级level（缩小 2^level 倍）下的像素点"""
+        raster = self._lod_rasters.get(level)
+        if raster is None:
+            try:
+                pixels = lod_pixels(self.item_type, self.p_list, self.algorithm, level) if self.p_list else []
+            except ValueError:
+                pixels = []
+            pixels = np.asarray(pixels, dtype=np.int64).reshape(-1, 2).tolist()
+            raster = QPolygon([QPoint(x, y) for x, y in pixels])
+            self._lod_rasters[level] = raster
+        return raster
+
+    def bounds(self) -> Tuple[float, float, float, float]:
+        """边界的 (x0, y0, x1, y1) 形式，用于空间索引"""
+        rect = self.boundingRect()
+        return rect.left(), rect.top(), rect.right(), rect.bottom()
+
+    def hit(self, x: float, y: float, tolerance: float = PICK_TOLERANCE) -> bool:
+        """(x, y)与光栅化结果中最近像素的距离是否不超过tolerance"""
+        pixels = self.pixels()
+        if len(pixels) == 0:
+            return False
+        dist = (pixels[:, 0] - x) ** 2 + (pixels[:, 1] - y) ** 2
+        return bool((dist <= tolerance * tolerance).any())
+
     def boundingRect(self) -> QRectF:
-        """定义图元边界（用于碰撞检测和重绘）"""
-        if not self.p_list:
-            return QRectF()
-        xs = [p[0] for p in self.p_list]
-        ys = [p[1] for p in self.p_list]
-        return QRectF(min(xs)-2, min(ys)-2, max(xs)-min(xs)+4, max(ys)-min(ys)+4)
+        """定义图元边界（用于碰撞检测和重绘），随像素缓存一起失效"""
+        if self._bounding_rect is None:
+            if not self.p_list:
+                self._bounding_rect = QRectF()
+            else:
+                xs = [p[0] for p in self.p_list]
+                ys = [p[1] for p in self.p_list]
+                self._bounding_rect = QRectF(min(xs)-2, min(ys)-2, max(xs)-min(xs)+4, max(ys)-min(ys)+4)
+        return self._bounding_rect
 
     def paint(self, painter: QPainter, option: QStyleOptionGraphicsItem, widget: Optional[QWidget] = None) -> None:
         """绘制图元（调用核心算法生成像素）"""
         # 设置画笔颜色
-        painter.setPen(QPen(QColor(*self.color), 1))
+        pen = QPen(QColor(*self.color), 1)
         if self.selected:
             # 选中状态绘制红色边框
-            painter.setPen(QPen(QColor(255, 0, 0), 2, Qt.DashLine))
-
-        # 根据图元类型调用对应算法
-        if self.item_type == 'line':
-            pixels = alg.draw_line(self.p_list, self.algorithm)
-        elif self.item_type == 'polygon':
-            pixels = alg.draw_polygon(self.p_list, self.algorithm)
-        elif self.item_type == 'ellipse':
-            pixels = alg.draw_ellipse(self.p_list)
-        elif self.item_type == 'curve':
-            pixels = alg.draw_curve(self.p_list, self.algorithm)
-        else:
+            pen = QPen(QColor(255, 0, 0), 2, Qt.DashLine)
+        lod = QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
+        level = lod_level(lod)
+        if level == 0:
+            painter.setPen(pen)
+            # 一次调用绘制全部像素点
+            painter.drawPoints(self.raster())
+            return
+        # 缩小显示：画笔宽度按屏幕像素计
+        pen.setCosmetic(True)
+        painter.setPen(pen)
+        rect = self.boundingRect()
+        if max(rect.width(), rect.height()) * lod < 1:
+            # 不足一个像素的图元画成一个点
+            painter.drawPoint(rect.center())
+            return
+        painter.save()
+        painter.scale(2 ** level, 2 ** level)
+        painter.drawPoints(self.lod_raster(level))
+        painter.restore()
+
+
+class ItemListModel(QAbstractListModel):
+    """图元列表的数据模型
+
+    ID全部保存在模型中，但只向视图公开已取出的前若干行，
+    其余行在视图滚动到底部时通过fetchMore按批取出，避免大量图元时视图反复布局
+    """
+    FETCH_BATCH = 256  # 每批向视图公开的行数
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.ids = []    # 行 -> 图元ID
+        self.rows = {}   # 图元ID -> 行
+        self.fetched = 0  # 已向视图公开的行数
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else self.fetched
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole):
+        if role == Qt.DisplayRole and index.isValid():
+            return self.ids[index.row()]
+        return None
+
+    def canFetchMore(self, parent: QModelIndex) -> bool:
+        return not parent.isValid() and self.fetched < len(self.ids)
+
+    def fetchMore(self, parent: QModelIndex):
+        if not parent.isValid():
+            self.fetch_until(self.fetched + self.FETCH_BATCH - 1)
+
+    def fetch_until(self, row: int):
+        """向视图公开到第row行为止"""
+        last = min(row, len(self.ids) - 1)
+        if last < self.fetched:
+            return
+        self.beginInsertRows(QModelIndex(), self.fetched, last)
+        self.fetched = last + 1
+        self.endInsertRows()
+
+    def append_ids(self, item_ids: List[str]):
+        """追加一批图元ID（已存在的ID不重复添加），只在首批未填满时通知视图"""
+        for item_id in item_ids:
+            if item_id not in self.rows:
+                self.rows[item_id] = len(self.ids)
+                self.ids.append(item_id)
+        if self.fetched < self.FETCH_BATCH:
+            self.fetch_until(self.FETCH_BATCH - 1)
+
+    def insert_id(self, row: int, item_id: str):
+        """在第row行插入图元ID（超出范围时追加到末尾）"""
+        row = min(row, len(self.ids))
+        visible = row < self.fetched
+        if visible:
+            self.beginInsertRows(QModelIndex(), row, row)
+        self.ids.insert(row, item_id)
+        for i in range(row, len(self.ids)):
+            self.rows[self.ids[i]] = i
+        if visible:
+            self.fetched += 1
+            self.endInsertRows()
+        elif self.fetched < self.FETCH_BATCH:
+            self.fetch_until(self.FETCH_BATCH - 1)
+
+    def remove_id(self, item_id: str):
+        """删除图元ID所在行"""
+        row = self.rows.pop(item_id, None)
+        if row is None:
+            return
+        visible = row < self.fetched
+        if visible:
+            self.beginRemoveRows(QModelIndex(), row, row)
+        del self.ids[row]
+        for i in range(row, len(self.ids)):
+            self.rows[self.ids[i]] = i
+        if visible:
+            self.fetched -= 1
+            self.endRemoveRows()
+
+    def clear(self):
+        self.beginResetModel()
+        self.ids = []
+        self.rows = {}
+        self.fetched = 0
+        self.endResetModel()
+
+    def index_of(self, item_id: str) -> QModelIndex:
+        """图元ID所在行的索引（必要时先取出该行），不存在时返回无效索引"""
+        row = self.rows.get(item_id)
+        if row is None:
+            return QModelIndex()
+        self.fetch_until(row)
+        return self.index(row)
+
+
+class CommandFileLoader(QObject):
+    """在空闲时间分批加载cg_cli指令文件
+
+    先用CommandExecutor执行全部指令（不输出图像），得到文件末尾的场景，
+    再把图元分批加入画布并在同一时间片内光栅化；每次回调最多占用LOAD_TIME_SLICE秒，事件循环保持响应。
+    加入图元期间画布至少每LOAD_REPAINT_INTERVAL秒才重绘一次，避免每批都重绘已加入的全部图元；
+    重绘时图元都已有像素缓存，一帧只需绘制不必光栅化，耗时与加载完成后的普通重绘相同，
+    图元越多重绘越慢，间隔随上一次重绘的耗时按LOAD_REPAINT_BACKOFF倍拉长；
+    加载期间暂停循环垃圾回收，否则对象数增多后单次回收就会占用上百毫秒。
+    某条指令出错时停止加载，画布保持不变，通过failed报告出错的行号
+    """
+    progress = pyqtSignal(int, int)  # 已完成步数，总步数
+    finished = pyqtSignal()
+    failed = pyqtSignal(str)         # 出错信息
+
+    class SceneExecutor(CommandExecutor):
+        """只构建场景、不写任何文件的指令执行器：打开指令文件只是为了查看
+
+        saveCanvas被忽略；saveScene只把快照保存在内存中，供同一文件后面的loadScene使用
+        """
+        def __init__(self, output_dir):
+            super().__init__(output_dir)
+            self.scenes = {}  # 快照名 -> (图元字典, 宽, 高, 画笔颜色)
+
+        def execute(self, line):
+            args = line.strip().split(' ')
+            if args[0] == 'saveScene':
+                self.scenes[args[1]] = ({item_id: list(item) for item_id, item in self.item_dict.items()},
+                                        self.width, self.height, self.pen_color.copy())
+            elif args[0] == 'loadScene' and args[1] in self.scenes:
+                item_dict, self.width, self.height, pen_color = self.scenes[args[1]]
+                self.item_dict = {item_id: list(item) for item_id, item in item_dict.items()}
+                self.pen_color = pen_color.copy()
+            else:
+                super().execute(line)
+
+        def save_canvas(self, save_name):
+            pass
+
+    def __init__(self, canvas: 'MyCanvas', path: str):
+        super().__init__(canvas)
+        self.canvas = canvas
+        self.path = path
+        with open(path, 'r') as fp:
+            self.lines = fp.readlines()
+        self.executor = self.SceneExecutor(os.path.dirname(os.path.abspath(path)))
+        self.line_no = 0
+        self.pending = None  # 待加入画布的 [(ID, 图元参数)]
+        self.added = 0
+        self.update_mode = None  # 加载前画布的视口更新模式
+        self.next_repaint = 0.0  # 下一次重绘的时刻
+        self.gc_was_enabled = False
+        self.timer = QTimer(self)
+        self.timer.setInterval(0)  # 事件队列空闲时触发
+        self.timer.timeout.connect(self.step)
+
+    @property
+    def total(self) -> int:
+        return len(self.lines) + (len(self.pending) if self.pending is not None else 0)
+
+    def start(self):
+        self.gc_was_enabled = gc.isenabled()
+        gc.disable()
+        self.timer.start()
+
+    def stop(self):
+        """停止定时器，恢复画布更新和垃圾回收"""
+        self.timer.stop()
+        self.restore_updates()
+        if self.gc_was_enabled:
+            gc.enable()
+            self.gc_was_enabled = False
+
+    def restore_updates(self):
+        """恢复画布的视口更新模式并重绘"""
+        if self.update_mode is not None:
+            self.canvas.setViewportUpdateMode(self.update_mode)
+            self.update_mode = None
+            self.canvas.viewport().update()
+
+    def step(self):
+        """处理一个时间片"""
+        deadline = time.perf_counter() + LOAD_TIME_SLICE
+        if self.pending is None:
+            # 阶段一：执行指令
+            while self.line_no < len(self.lines) and time.perf_counter() < deadline:
+                line = self.lines[self.line_no]
+                try:
+                    self.executor.execute(line)
+                except Exception as e:
+                    # 异常不能离开定时器的槽函数，否则PyQt会终止进程
+                    self.stop()
+                    self.failed.emit(f"第{self.line_no + 1}行 \"{line.strip()}\" 出错：{type(e).__name__}: {e}")
+                    return
+                self.line_no += 1
+            if self.line_no < len(self.lines):
+                self.progress.emit(self.line_no, self.total)
+                return
+            self.pending = list(self.executor.item_dict.items())
+            self.canvas.reset_canvas(self.executor.width, self.executor.height)
+            self.canvas.current_color = tuple(int(c) for c in self.executor.pen_color)
+            self.update_mode = self.canvas.viewportUpdateMode()
+            self.canvas.setViewportUpdateMode(QGraphicsView.NoViewportUpdate)
+        # 阶段二：分批加入图元，并按当前缩放等级光栅化，重绘时不再在一帧内集中光栅化
+        level = lod_level(QStyleOptionGraphicsItem.levelOfDetailFromTransform(self.canvas.transform()))
+        batch = []
+        while self.added < len(self.pending) and time.perf_counter() < deadline:
+            item_id, (item_type, p_list, algorithm, color) = self.pending[self.added]
+            item = self.canvas.add_item(item_id, item_type, p_list, algorithm, tuple(int(c) for c in color))
+            # 光栅合成模式下add_item已经光栅化并合成到缓冲区上
+            if not self.canvas.raster_mode:
+                if level == 0:
+                    item.raster()
+                else:
+                    item.lod_raster(level)
+            batch.append(item_id)
+            self.added += 1
+        self.canvas.add_list_entries(batch)
+        self.progress.emit(self.line_no + self.added, self.total)
+        if self.added == len(self.pending):
+            self.stop()
+            self.finished.emit()
+        elif time.perf_counter() >= self.next_repaint:
+            # 同步重绘以便计时
+            start = time.perf_counter()
+            self.canvas.viewport().repaint()
+            cost = time.perf_counter() - start
+            self.next_repaint = time.perf_counter() + max(LOAD_REPAINT_INTERVAL, cost * LOAD_REPAINT_BACKOFF)
+
+
+class CanvasExporter(QThread):
+    """在工作线程中导出画布
+
+    把图元快照用与cg_cli相同的合成器光栅化到离屏的numpy缓冲区，只光栅化一次，
+    再按每个目标的比例缩放、编码并写出；先写临时文件再改名，取消或出错时不会留下不完整的图像。
+    导出的图像与屏幕显示和cg_cli的输出一致，以场景左上角为原点、y轴向下。
+    快照中的控制点列表与画布共享：编辑图元总是给p_list赋新列表，不会原地修改
+    """
+    progress = pyqtSignal(int, int)  # 已完成步数，总步数
+    completed = pyqtSignal(list)     # 写出的文件路径
+    cancelled = pyqtSignal()
+    failed = pyqtSignal(str)
+
+    def __init__(self, items: list, width: int, height: int, targets: List[Tuple[str, float]],
+                 base: np.ndarray = None, parent=None):
+        """
+        :param items: (list of [类型, 控制点, 算法, 颜色]) 自下而上的图元快照
+        :param width: (int) 画布宽度
+        :param height: (int) 画布高度
+        :param targets: (list of (路径, 比例)) 导出目标，格式由扩展名决定
+        :param base: (numpy.ndarray) 已合成好的缓冲区（由导出线程独占），items合成在它上面；默认为白色画布
+        """
+        super().__init__(parent)
+        self.items = items
+        self.width = width
+        self.height = height
+        self.targets = targets
+        self.base = base
+
+    def run(self):
+        try:
+            written = self.export()
+        except Exception as e:
+            self.failed.emit(str(e))
             return
+        if written is None:
+            self.cancelled.emit()
+        else:
+            self.completed.emit(written)
 
-        # 绘制所有像素点
-        for (x, y) in pixels:
-            painter.drawPoint(x, y)
+    def export(self) -> Optional[List[str]]:
+        """光栅化并写出全部目标，被取消时返回None"""
+        total = len(self.items) + len(self.targets)
+        canvas = self.base if self.base is not None else np.full((self.height, self.width, 3), 255, np.uint8)
+        for start in range(0, len(self.items), EXPORT_BATCH):
+            if self.isInterruptionRequested():
+                return None
+            composite(canvas, self.items[start:start + EXPORT_BATCH], self.height)
+            self.progress.emit(min(start + EXPORT_BATCH, len(self.items)), total)
+        image = Image.fromarray(canvas)
+        extensions = Image.registered_extensions()
+        written = []
+        for i, (path, scale) in enumerate(self.targets):
+            if self.isInterruptionRequested():
+                return None
+            output = image
+            if scale != 1:
+                size = (max(1, round(self.width * scale)), max(1, round(self.height * scale)))
+                # 放大保持像素边缘清晰，缩小时平滑采样
+                output = image.resize(size, Image.NEAREST if scale > 1 else Image.LANCZOS)
+            temp_path = path + '.part'
+            try:
+                output.save(temp_path, extensions[os.path.splitext(path)[1].lower()])
+                os.replace(temp_path, path)
+            except Exception:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+            written.append(path)
+            self.progress.emit(len(self.items) + i + 1, total)
+        return written
 
 
 class MyCanvas(QGraphicsView):
@@ -80,23 +496,66 @@ class MyCanvas(QGraphicsView):
         self.temp_points = []          # 绘制临时点
         self.selected_item = None      # 选中的图元
         self.edit_start_pos = None     # 编辑起始位置
-        self.preview_item = None       # 预览图元
+        self.edit_origin = None        # 拖动开始时图元的控制点，变换总是从它计算
+        self.preview_item = None       # 预览图元（常驻场景，原地更新几何）
+        self.preview_pos = None        # 尚未处理的最新预览位置
+
+        # 鼠标移动事件按屏幕刷新率合并，每帧最多更新一次预览
+        screen = QApplication.primaryScreen()
+        refresh_rate = screen.refreshRate() if screen is not None and screen.refreshRate() > 0 else 60
+        self.preview_timer = QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(max(1, int(1000 / refresh_rate)))
+        self.preview_timer.timeout.connect(self.update_preview)
+        # 未按下鼠标键时也接收移动事件，第一个点之后即可预览
+        self.setMouseTracking(True)
+
+        # 缩放与平移：滚轮以鼠标位置为中心缩放，按住中键拖动平移
+        self.zoom = 1.0
+        self.pan_start = None
+        self.setTransformationAnchor(QGraphicsView.AnchorUnderMouse)
+
+        # 图元ID -> 图元，保持添加顺序
+        self.item_dict = {}
+        # 图元边界的网格索引（键为图元ID），用于点选和局部重新合成
+        self.index = GridIndex()
+        self.next_serial = 0
+        # 撤销/重做日志：只记录新建、删除的图元和每次拖动的仿射矩阵
+        self.journal = EditJournal()
+        # 正在进行的指令文件加载和后台导出
+        self.loader = None
+        self.exporter = None
+
+        # 光栅合成模式：已提交的图元用各自缓存的像素、经cg_cli的合成器合成到一块numpy缓冲区中，
+        # 只有选中图元和预览图元作为场景中的图元实时绘制
+        self.raster_mode = False
+        self.backing = None            # (height, width, 3) 的RGB缓冲区，第y行对应场景纵坐标y
+        self.backing_image = None      # 直接引用backing内存的QImage
 
         # 关联图元列表
-        self.list_widget = None
+        self.list_view = None
+        self.list_model = ItemListModel(self)
+
+        # 绘制计时回调 (开始时刻, 结束时刻)，回放交互轨迹时使用
+        self.paint_listener = None
 
-    def set_list_widget(self, list_widget):
+    def set_list_view(self, list_view: QListView):
         """关联图元列表组件"""
-        self.list_widget = list_widget
-        self.list_widget.itemClicked.connect(self.on_list_item_clicked)
+        self.list_view = list_view
+        self.list_view.setModel(self.list_model)
+        self.list_view.clicked.connect(self.on_list_item_clicked)
 
     def start_drawing(self, draw_type: str, algorithm: str, item_id: str):
-        """开始绘制图元"""
+        """开始绘制图元，ID已被画布上的图元使用时拒绝"""
+        if item_id in self.item_dict:
+            self.statusBar.showMessage(f"图元ID {item_id} 已存在，请使用其他ID")
+            return
         self.current_state = "drawing"
         self.current_draw_type = draw_type
         self.current_algorithm = algorithm
         self.current_item_id = item_id
         self.temp_points = []
+        self.hide_preview()
         self.statusBar.showMessage(f"绘制{draw_type}（算法：{algorithm}），点击添加点，右键结束")
 
     def set_color(self, color: Tuple[int, int, int]):
@@ -107,25 +566,343 @@ class MyCanvas(QGraphicsView):
     def reset_canvas(self, width: int, height: int):
         """重置画布"""
         self.scene.clear()
+        self.item_dict = {}
+        self.index.clear()
+        self.journal.clear()
         # 清除所有临时状态（关键修复）
         self.temp_points = []
         self.selected_item = None
-        self.preview_item = None
+        self.preview_item = None  # scene.clear()已删除预览图元
+        self.preview_pos = None
+        self.preview_timer.stop()
         self.current_state = "idle"
         # 更新列表和场景
-        if self.list_widget:
-            self.list_widget.clear()
+        self.list_model.clear()
         self.setSceneRect(0, 0, width, height)
+        if self.raster_mode:
+            self.allocate_backing()
         self.scene.update()  # 强制刷新
         self.statusBar.showMessage(f"画布重置为 {width}x{height}")
 
-    def save_canvas(self, path: str):
-        """保存画布为图片"""
-        img = QImage(self.sceneRect().size().toSize(), QImage.Format_RGB32)
-        painter = QPainter(img)
-        self.scene.render(painter)
-        img.save(path)
-        self.statusBar.showMessage(f"画布已保存至 {path}")
+    def export_canvas(self, targets: List[Tuple[str, float]], on_progress=None, on_finished=None) -> CanvasExporter:
+        """在后台线程中导出画布，之前未完成的导出会被取消
+
+        :param targets: (list of (路径, 比例)) 导出目标，格式由扩展名决定
+        :param on_progress: (callable) 连接到progress的槽
+        :param on_finished: (callable) 连接到finished的槽；必须在线程启动前连接，否则很快结束的导出会错过信号
+        """
+        self.cancel_export()
+        rect = self.sceneRect()
+        if self.raster_mode:
+            # 缓冲区已合成了除选中图元以外的全部图元：在副本上按层次补上选中图元所在的区域即可
+            base = self.backing.copy()
+            if self.selected_item is not None:
+                self.composite_region(base, self.selected_item.boundingRect())
+            items = []
+        else:
+            base = None
+            items = [self.item_data(item) for item in self.item_dict.values()]
+        self.exporter = CanvasExporter(items, int(rect.width()), int(rect.height()), targets, base, self)
+        self.exporter.completed.connect(self.on_export_completed)
+        self.exporter.cancelled.connect(lambda: self.statusBar.showMessage("导出已取消"))
+        self.exporter.failed.connect(lambda message: self.statusBar.showMessage(f"导出失败：{message}"))
+        if on_progress is not None:
+            self.exporter.progress.connect(on_progress)
+        if on_finished is not None:
+            self.exporter.finished.connect(on_finished)
+        self.exporter.start()
+        self.statusBar.showMessage(f"正在导出 {len(targets)} 个文件 ...")
+        return self.exporter
+
+    def cancel_export(self):
+        """取消正在进行的导出，等待工作线程在当前批次结束后退出"""
+        if self.exporter is not None:
+            self.exporter.requestInterruption()
+            self.exporter.wait()
+            self.exporter = None
+
+    def on_export_completed(self, paths: List[str]):
+        self.statusBar.showMessage("画布已导出至 " + ", ".join(paths))
+
+    def save_scene(self, path: str):
+        """保存场景快照（图元、画布尺寸和画笔颜色）"""
+        item_dict = {item_id: [item.item_type, item.p_list, item.algorithm, item.color]
+                     for item_id, item in self.item_dict.items()}
+        rect = self.sceneRect()
+        try:
+            cg_scene.save_scene(path, item_dict, int(rect.width()), int(rect.height()), self.current_color)
+        except (OSError, ValueError) as e:
+            self.statusBar.showMessage(f"保存场景失败：{e}")
+            return
+        self.statusBar.showMessage(f"场景已保存至 {path}")
+
+    def load_scene(self, path: str):
+        """从场景快照恢复画布，文件无法读取或已损坏时保留当前画布并在状态栏报告"""
+        try:
+            item_dict, width, height, pen_color = cg_scene.load_scene(path)
+        except (OSError, ValueError) as e:
+            self.statusBar.showMessage(f"加载场景失败：{e}")
+            return
+        self.cancel_loading()
+        self.reset_canvas(width, height)
+        self.current_color = tuple(int(c) for c in pen_color)
+        for item_id, (item_type, p_list, algorithm, color) in item_dict.items():
+            self.add_item(item_id, item_type, p_list, algorithm, tuple(int(c) for c in color))
+        if self.raster_mode:
+            self.recomposite()
+        self.add_list_entries(list(self.item_dict))
+        self.statusBar.showMessage(f"已加载场景 {path}，共 {len(self.item_dict)} 个图元")
+
+    def open_command_file(self, path: str) -> CommandFileLoader:
+        """开始分批加载指令文件，之前未完成的加载会被取消"""
+        self.cancel_loading()
+        self.loader = CommandFileLoader(self, path)
+        self.loader.finished.connect(self.on_command_file_loaded)
+        self.loader.failed.connect(self.on_command_file_failed)
+        self.loader.start()
+        self.statusBar.showMessage(f"正在加载 {path} ...")
+        return self.loader
+
+    def cancel_loading(self):
+        """取消正在进行的指令文件加载"""
+        if self.loader is not None:
+            self.loader.stop()
+            self.loader = None
+
+    def on_command_file_loaded(self):
+        self.statusBar.showMessage(f"已加载 {self.loader.path}，共 {len(self.item_dict)} 个图元")
+        self.loader = None
+
+    def on_command_file_failed(self, message: str):
+        self.statusBar.showMessage(f"加载 {self.loader.path} 失败，{message}")
+        self.loader = None
+
+    def add_item(self, item_id: str, item_type: str, p_list: list, algorithm: str,
+                 color: Tuple[int, int, int], serial: int = None) -> MyItem:
+        """创建图元并加入场景
+
+        :param serial: (int) 恢复被删除的图元时沿用原来的添加顺序，默认位于最上层
+        """
+        if item_id in self.item_dict:
+            # 与cg_cli相同：同一ID的新图元替换旧图元，并沿用旧图元的层次
+            old = self.remove_item(item_id)
+            if serial is None:
+                serial = old.serial
+        item = MyItem(
+            item_id=item_id,
+            item_type=item_type,
+            p_list=p_list,
+            algorithm=algorithm,
+            color=color
+        )
+        if serial is not None and serial <= self.next_serial:
+            item.serial = serial
+            self.item_dict[item_id] = item
+            self.item_dict = {i.id: i for i in self.items_in_order(self.item_dict)}
+            self.index.insert(item_id, item.bounds())
+            if self.raster_mode:
+                self.recomposite(item.boundingRect())
+            else:
+                self.scene.addItem(item)
+                # 放回原来的层次：置于重叠图元中比它更靠上的最下面一个之下
+                above = [other for other in self.items_in_order(self.index.query_rect(*item.bounds()))
+                         if other.serial > serial and other.scene() is not None]
+                if above:
+                    item.stackBefore(above[0])
+            return item
+        self.next_serial = max(self.next_serial + 1, serial or 0)
+        item.serial = self.next_serial
+        self.item_dict[item_id] = item
+        self.index.insert(item_id, item.bounds())
+        if self.raster_mode:
+            # 新图元位于最上层，直接合成到缓冲区上
+            composite(self.backing, [(item.pixels(), item.color)], self.backing.shape[0], rasterized=True)
+            self.scene.update(item.boundingRect())
+        else:
+            self.scene.addItem(item)
+        return item
+
+    def add_list_entries(self, item_ids: List[str]):
+        """把图元ID加入图元列表"""
+        self.list_model.append_ids(item_ids)
+
+    def item_record(self, item: MyItem) -> ItemRecord:
+        """撤销日志中重新创建图元所需的参数"""
+        row = self.list_model.rows.get(item.id, len(self.list_model.ids))
+        return ItemRecord(item.id, item.item_type, item.p_list, item.algorithm, item.color, item.serial, row)
+
+    def restore_item(self, record: ItemRecord):
+        """按撤销日志中的记录重新加入图元"""
+        self.add_item(record.item_id, record.item_type, record.p_list, record.algorithm,
+                      record.color, record.serial)
+        self.list_model.insert_id(record.row, record.item_id)
+
+    def remove_item(self, item_id: str) -> MyItem:
+        """从画布删除图元"""
+        item = self.item_dict.pop(item_id)
+        self.index.remove(item_id)
+        if item is self.selected_item:
+            item.selected = False
+            self.selected_item = None
+        if item.scene() is not None:
+            self.scene.removeItem(item)
+        elif self.raster_mode:
+            self.recomposite(item.boundingRect())
+        self.list_model.remove_id(item_id)
+        return item
+
+    def item_points(self, item_id: str) -> list:
+        return self.item_dict[item_id].p_list
+
+    def apply_geometry(self, item_id: str, p_list: list):
+        """只更新一个图元的控制点：重新光栅化该图元并更新它在索引中的边界"""
+        item = self.item_dict[item_id]
+        old_rect = item.boundingRect()
+        item.p_list = p_list
+        self.index.insert(item_id, item.bounds())
+        if self.raster_mode and item.scene() is None:
+            self.recomposite(old_rect.united(item.boundingRect()))
+
+    def delete_selected(self):
+        """删除选中图元"""
+        if self.current_state != "idle" or self.selected_item is None:
+            return
+        item = self.selected_item
+        self.journal.record_deleted(self.item_record(item))
+        self.remove_item(item.id)
+        self.statusBar.showMessage(f"已删除图元：{item.id}")
+
+    def undo(self):
+        """撤销最近一次编辑"""
+        if self.current_state != "idle" or self.loader is not None:
+            return
+        item_id = self.journal.undo(self)
+        self.statusBar.showMessage("没有可撤销的操作" if item_id is None else f"已撤销：{item_id}")
+
+    def redo(self):
+        """重做最近一次撤销的编辑"""
+        if self.current_state != "idle" or self.loader is not None:
+            return
+        item_id = self.journal.redo(self)
+        self.statusBar.showMessage("没有可重做的操作" if item_id is None else f"已重做：{item_id}")
+
+    def items_in_order(self, item_ids) -> List[MyItem]:
+        """按添加顺序（自下而上）排列图元"""
+        return sorted((self.item_dict[item_id] for item_id in item_ids), key=lambda item: item.serial)
+
+    @staticmethod
+    def item_data(item: MyItem) -> list:
+        """图元的合成参数：[类型, 控制点, 算法, 颜色]"""
+        return [item.item_type, item.p_list, item.algorithm, item.color]
+
+    def set_raster_mode(self, enabled: bool):
+        """切换光栅合成模式"""
+        if enabled == self.raster_mode:
+            return
+        self.raster_mode = enabled
+        for item in self.item_dict.values():
+            if item is self.selected_item:
+                continue
+            if enabled:
+                self.scene.removeItem(item)
+            else:
+                self.scene.addItem(item)
+        if enabled:
+            self.allocate_backing()
+        else:
+            self.backing = None
+            self.backing_image = None
+        self.scene.update()
+        self.statusBar.showMessage("光栅合成模式已" + ("开启" if enabled else "关闭"))
+
+    def allocate_backing(self):
+        """按画布尺寸分配缓冲区并合成全部图元"""
+        size = self.sceneRect().size().toSize()
+        width, height = size.width(), size.height()
+        self.backing = np.full((height, width, 3), 255, np.uint8)
+        # QImage与numpy数组共享内存，不做拷贝；self.backing必须在QImage之前一直存活
+        self.backing_image = QImage(self.backing.data, width, height, width * 3, QImage.Format_RGB888)
+        self.recomposite()
+
+    def recomposite(self, rect: QRectF = None):
+        """重新合成缓冲区的一个矩形区域（场景坐标），rect为None时重新合成整张画布"""
+        area = self.composite_region(self.backing, rect, self.selected_item)
+        if area is not None:
+            self.scene.update(area)
+
+    def composite_region(self, canvas: np.ndarray, rect: QRectF = None,
+                         exclude: MyItem = None) -> Optional[QRectF]:
+        """在与缓冲区同样大小的canvas上按层次重新合成一个矩形区域
+
+        :param rect: (QRectF) 场景坐标中的区域，为None时重新合成整张画布
+        :param exclude: (MyItem) 不合成的图元（光栅合成模式下实时绘制的选中图元）
+        :return: (QRectF) 实际合成的区域，与画布不相交时返回None
+        """
+        height, width = canvas.shape[:2]
+        if rect is None:
+            x0, y0, x1, y1 = 0, 0, width, height
+        else:
+            x0 = max(0, math.floor(rect.left()))
+            y0 = max(0, math.floor(rect.top()))
+            x1 = min(width, math.ceil(rect.right()) + 1)
+            y1 = min(height, math.ceil(rect.bottom()) + 1)
+            if x0 >= x1 or y0 >= y1:
+                return None
+        region = canvas[y0:y1, x0:x1]
+        region.fill(255)
+        candidates = self.item_dict.values() if rect is None else \
+            self.items_in_order(self.index.query_rect(x0, y0, x1, y1))
+        # 复用各图元缓存的像素，只有从未光栅化过的图元才会调用核心算法
+        composite(region, ((item.pixels(), item.color) for item in candidates if item is not exclude),
+                  height, offset=(y0, x0), rasterized=True)
+        return QRectF(x0, y0, x1 - x0, y1 - y0)
+
+    def paintEvent(self, event) -> None:
+        if self.paint_listener is None:
+            super().paintEvent(event)
+            return
+        start = time.perf_counter()
+        super().paintEvent(event)
+        self.paint_listener(start, time.perf_counter())
+
+    def drawBackground(self, painter: QPainter, rect: QRectF) -> None:
+        """光栅合成模式下以缓冲区作为背景"""
+        if not self.raster_mode or self.backing_image is None:
+            super().drawBackground(painter, rect)
+            return
+        painter.drawImage(0, 0, self.backing_image)
+
+    def set_selected_item(self, item: Optional[MyItem]):
+        """设置选中图元；光栅合成模式下选中图元从缓冲区移出，作为场景图元实时绘制"""
+        previous = self.selected_item
+        if previous is not None:
+            previous.selected = False
+            previous.update()
+        self.selected_item = item
+        if item is not None:
+            item.selected = True
+            item.update()
+        if self.raster_mode and previous is not item:
+            if previous is not None:
+                self.scene.removeItem(previous)
+                self.recomposite(previous.boundingRect())
+            if item is not None:
+                self.scene.addItem(item)
+                self.recomposite(item.boundingRect())
+
+    def item_at(self, scene_pos: QPointF) -> Optional[MyItem]:
+        """查找鼠标位置处最上层的图元：先用网格索引筛选候选，再按实际像素判断是否命中"""
+        x, y = scene_pos.x(), scene_pos.y()
+        candidates = self.items_in_order(self.index.query_point(x, y, PICK_TOLERANCE))
+        candidates.reverse()
+        # 光栅合成模式下选中图元绘制在最上层，优先判断
+        if self.raster_mode and self.selected_item in candidates:
+            candidates.remove(self.selected_item)
+            candidates.insert(0, self.selected_item)
+        for item in candidates:
+            if item.hit(x, y):
+                return item
+        return None
 
     def start_editing(self, operation: str):
         """开始编辑操作（平移/旋转/缩放）"""
@@ -136,24 +913,36 @@ class MyCanvas(QGraphicsView):
         self.edit_operation = operation
         self.statusBar.showMessage(f"编辑：{operation}，拖动鼠标完成操作")
 
-    def on_list_item_clicked(self, item):
+    def on_list_item_clicked(self, index: QModelIndex):
         """图元列表项点击事件"""
-        item_id = item.text()
-        # 取消之前的选中状态
-        if self.selected_item:
-            self.selected_item.selected = False
-            self.selected_item.update()
-            self.selected_item = None  # 显式置空
-        # 选中新图元
-        for scene_item in self.scene.items():
-            if isinstance(scene_item, MyItem) and scene_item.id == item_id:
-                self.selected_item = scene_item
-                self.selected_item.selected = True
-                self.selected_item.update()
-                break
-        self.scene.update()  # 刷新场景
+        item_id = self.list_model.ids[index.row()]
+        self.set_selected_item(self.item_dict.get(item_id))
+
+    def set_zoom(self, zoom: float):
+        """设置视图缩放比例"""
+        zoom = min(MAX_ZOOM, max(MIN_ZOOM, zoom))
+        self.scale(zoom / self.zoom, zoom / self.zoom)
+        self.zoom = zoom
+        self.statusBar.showMessage(f"缩放：{zoom * 100:.1f}%")
+
+    def reset_zoom(self):
+        """恢复100%缩放"""
+        self.resetTransform()
+        self.zoom = 1.0
+        self.statusBar.showMessage("缩放：100%")
+
+    def wheelEvent(self, event: QWheelEvent) -> None:
+        delta = event.angleDelta().y()
+        if delta == 0:
+            return
+        self.set_zoom(self.zoom * (ZOOM_STEP if delta > 0 else 1 / ZOOM_STEP))
 
     def mousePressEvent(self, event: QMouseEvent) -> None:
+        if event.button() == Qt.MiddleButton:
+            # 中键拖动平移
+            self.pan_start = event.pos()
+            self.viewport().setCursor(Qt.ClosedHandCursor)
+            return
         pos = self.mapToScene(event.pos())
         x, y = int(pos.x()), int(pos.y())
 
@@ -165,8 +954,9 @@ class MyCanvas(QGraphicsView):
                 if self.current_draw_type in ["line", "ellipse"] and len(self.temp_points) == 2:
                     self.finish_drawing()
             elif self.current_state == "editing":
-                # 记录编辑起始位置
+                # 记录编辑起始位置和原始几何
                 self.edit_start_pos = (x, y)
+                self.edit_origin = self.selected_item.p_list
             else:  # idle状态：点击选中图元
                 self.select_item(pos)
 
@@ -178,81 +968,117 @@ class MyCanvas(QGraphicsView):
         super().mousePressEvent(event)
 
     def mouseMoveEvent(self, event: QMouseEvent) -> None:
-        if self.current_state == "drawing" and len(self.temp_points) == 1:
-            # 实时预览（线段/椭圆）
+        if self.pan_start is not None:
+            delta = event.pos() - self.pan_start
+            self.pan_start = event.pos()
+            self.horizontalScrollBar().setValue(self.horizontalScrollBar().value() - delta.x())
+            self.verticalScrollBar().setValue(self.verticalScrollBar().value() - delta.y())
+            return
+        if self.current_state == "drawing" and self.current_draw_type in PREVIEW_TYPES and len(self.temp_points) == 1:
+            # 实时预览（线段/椭圆）：只记录最新位置，由定时器在下一帧统一更新
             pos = self.mapToScene(event.pos())
-            x, y = int(pos.x()), int(pos.y())
-            # 移除上一次预览（关键修复：确保预览图元被彻底移除）
-            if self.preview_item:
-                self.scene.removeItem(self.preview_item)
-                self.preview_item = None  # 显式置空，避免引用残留
-            # 生成预览图元
-            preview_points = self.temp_points + [[x, y]]
-            self.preview_item = MyItem(
-                id="preview",
-                item_type=self.current_draw_type,
-                p_list=preview_points,
-                algorithm=self.current_algorithm,
-                color=(128, 128, 128)  # 灰色预览
-            )
-            self.scene.addItem(self.preview_item)
+            self.preview_pos = [int(pos.x()), int(pos.y())]
+            if not self.preview_timer.isActive():
+                self.preview_timer.start()
 
         elif self.current_state == "editing" and self.edit_start_pos and self.selected_item:
-            # 实时编辑（平移/旋转/缩放）
+            # 实时编辑：只更新图元的QTransform预览，松开鼠标时再重新光栅化
             pos = self.mapToScene(event.pos())
-            x, y = int(pos.x()), int(pos.y())
-            dx = x - self.edit_start_pos[0]
-            dy = y - self.edit_start_pos[1]
-
-            # 调用核心算法更新图元
-            if self.edit_operation == "translate":
-                new_points = alg.translate(self.selected_item.p_list, dx, dy)
-            elif self.edit_operation == "rotate":
-                # 以初始点击位置为旋转中心
-                cx, cy = self.edit_start_pos
-                angle = math.atan2(dy, dx) * 180 / math.pi  # 计算旋转角度
-                new_points = alg.rotate(self.selected_item.p_list, cx, cy, angle)
-            elif self.edit_operation == "scale":
-                cx, cy = self.edit_start_pos
-                scale = 1.0 + (dx + dy) / 100  # 简单缩放因子计算
-                new_points = alg.scale(self.selected_item.p_list, cx, cy, scale)
-            else:
-                return
-
-            # 更新图元后强制刷新
-            self.selected_item.p_list = new_points
-            self.selected_item.update()  # 更新单个图元
-            self.scene.update()  # 强制刷新整个场景（关键修复）
-            self.edit_start_pos = (x, y)
+            transform, _ = self.edit_transform(int(pos.x()), int(pos.y()))
+            self.selected_item.setTransform(transform)
 
         super().mouseMoveEvent(event)
 
     def mouseReleaseEvent(self, event: QMouseEvent) -> None:
+        if event.button() == Qt.MiddleButton and self.pan_start is not None:
+            self.pan_start = None
+            self.viewport().unsetCursor()
+            return
         if self.current_state == "editing":
+            if self.edit_start_pos and self.selected_item:
+                # 从原始几何一次性计算最终控制点，只光栅化一次
+                pos = self.mapToScene(event.pos())
+                transform, new_points = self.edit_transform(int(pos.x()), int(pos.y()))
+                self.selected_item.setTransform(QTransform())
+                if self.edit_origin and new_points != self.edit_origin:
+                    # 日志只记录本次拖动的矩阵
+                    self.journal.record_transform(self.selected_item.id, qtransform_matrix(transform),
+                                                  self.edit_origin, new_points, self.edit_operation)
+                self.apply_geometry(self.selected_item.id, new_points)
+            self.edit_start_pos = None
+            self.edit_origin = None
             self.current_state = "idle"
             self.statusBar.showMessage("编辑完成")
         super().mouseReleaseEvent(event)
 
+    def edit_transform(self, x: int, y: int) -> Tuple[QTransform, Optional[list]]:
+        """由拖动起点到(x, y)的总位移计算变换
+
+        :return: 预览用的QTransform，以及对原始控制点应用核心算法后的新控制点（未知操作保持原控制点）
+        """
+        dx = x - self.edit_start_pos[0]
+        dy = y - self.edit_start_pos[1]
+        cx, cy = self.edit_start_pos
+        backend = current_backend()
+        if self.edit_operation == "translate":
+            transform = QTransform.fromTranslate(dx, dy)
+            apply = lambda p_list: backend.translate(p_list, dx, dy)
+        elif self.edit_operation == "rotate":
+            # 以初始点击位置为旋转中心；核心算法为顺时针角度，对应QTransform的-r
+            angle = math.atan2(dy, dx) * 180 / math.pi  # 计算旋转角度
+            transform = QTransform().translate(cx, cy).rotate(-angle).translate(-cx, -cy)
+            apply = lambda p_list: backend.rotate(p_list, cx, cy, angle)
+        elif self.edit_operation == "scale":
+            scale = 1.0 + (dx + dy) / 100  # 简单缩放因子计算
+            transform = QTransform().translate(cx, cy).scale(scale, scale).translate(-cx, -cy)
+            apply = lambda p_list: backend.scale(p_list, cx, cy, scale)
+        else:
+            return QTransform(), self.edit_origin
+        return transform, apply(self.edit_origin) if self.edit_origin else self.edit_origin
+
+    def update_preview(self):
+        """用最新的鼠标位置原地更新预览图元"""
+        if self.preview_pos is None or self.current_state != "drawing" or \
+                self.current_draw_type not in PREVIEW_TYPES or len(self.temp_points) != 1:
+            return
+        preview_points = self.temp_points + [self.preview_pos]
+        self.preview_pos = None
+        if self.preview_item is None:
+            self.preview_item = MyItem(
+                item_id="preview",
+                item_type=self.current_draw_type,
+                p_list=preview_points,
+                algorithm=self.current_algorithm,
+                color=(128, 128, 128)  # 灰色预览
+            )
+            self.preview_item.setZValue(1)  # 始终位于已提交图元之上
+            self.scene.addItem(self.preview_item)
+            return
+        # 重新赋值p_list会调用prepareGeometryChange，Qt只重绘新旧边界的并集
+        self.preview_item.item_type = self.current_draw_type
+        self.preview_item.algorithm = self.current_algorithm
+        self.preview_item.p_list = preview_points
+        self.preview_item.setVisible(True)
+
+    def hide_preview(self):
+        """隐藏预览图元并丢弃未处理的鼠标位置"""
+        self.preview_timer.stop()
+        self.preview_pos = None
+        if self.preview_item is not None:
+            self.preview_item.setVisible(False)
+
     def finish_drawing(self):
         """完成绘制并添加图元到画布"""
-        # 移除预览
-        if self.preview_item:
-            self.scene.removeItem(self.preview_item)
-            self.preview_item = None
+        # 隐藏预览
+        self.hide_preview()
 
         # 创建图元
-        item = MyItem(
-            item_id=self.current_item_id,
-            item_type=self.current_draw_type,
-            p_list=self.temp_points,
-            algorithm=self.current_algorithm,
-            color=self.current_color
-        )
-        self.scene.addItem(item)
+        self.add_item(self.current_item_id, self.current_draw_type, self.temp_points,
+                      self.current_algorithm, self.current_color)
 
         # 添加到图元列表
-        if self.list_widget:
-            self.list_widget.addItem(self.current_item_id)
+        self.add_list_entries([self.current_item_id])
+        self.journal.record_created(self.item_record(self.item_dict[self.current_item_id]))
 
         # 重置状态
         self.current_state = "idle"
@@ -260,26 +1086,68 @@ class MyCanvas(QGraphicsView):
 
     def select_item(self, scene_pos: QPointF):
         """通过鼠标位置选中图元"""
-        # 取消之前的选中
-        if self.selected_item:
-            self.selected_item.selected = False
-            self.selected_item.update()
-            self.selected_item = None
+        # 查找点击位置的图元，未命中时取消选中
+        item = self.item_at(scene_pos)
+        self.set_selected_item(item)
+        if item is not None:
+            # 更新列表选中状态
+            if self.list_view is not None:
+                self.list_view.setCurrentIndex(self.list_model.index_of(item.id))
+            self.statusBar.showMessage(f"选中图元：{item.id}")
+
+
+class ExportDialog(QDialog):
+    """导出画布对话框：一次导出多种格式和尺寸"""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("导出画布")
+        layout = QFormLayout(self)
+
+        # 文件路径（不含扩展名）
+        path_layout = QHBoxLayout()
+        self.path_input = QLineEdit()
+        browse_btn = QPushButton("浏览")
+        browse_btn.clicked.connect(self.browse)
+        path_layout.addWidget(self.path_input)
+        path_layout.addWidget(browse_btn)
+        layout.addRow("文件名:", path_layout)
+
+        # 格式
+        format_layout = QHBoxLayout()
+        self.format_boxes = {}
+        for ext in EXPORT_FORMATS:
+            box = QCheckBox(ext.upper())
+            box.setChecked(ext == 'bmp')
+            format_layout.addWidget(box)
+            self.format_boxes[ext] = box
+        layout.addRow("格式:", format_layout)
+
+        # 尺寸比例
+        self.scale_input = QLineEdit("1")
+        self.scale_input.setPlaceholderText("如 1, 0.5, 2")
+        layout.addRow("比例:", self.scale_input)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+
+    def browse(self):
+        path, _ = QFileDialog.getSaveFileName(self, "导出画布", self.path_input.text())
+        if path:
+            self.path_input.setText(os.path.splitext(path)[0])
 
-        # 查找点击位置的图元
-        for item in self.scene.items(scene_pos):
-            if isinstance(item, MyItem):
-                self.selected_item = item
-                self.selected_item.selected = True
-                self.selected_item.update()
-                # 更新列表选中状态
-                if self.list_widget:
-                    for i in range(self.list_widget.count()):
-                        if self.list_widget.item(i).text() == item.id:
-                            self.list_widget.setCurrentRow(i)
-                            break
-                self.statusBar.showMessage(f"选中图元：{item.id}")
-                break
+    def targets(self) -> List[Tuple[str, float]]:
+        """全部导出目标，比例不为1的文件名带 _<比例>x 后缀；输入无效时返回空列表"""
+        base = self.path_input.text().strip()
+        try:
+            scales = [float(text) for text in self.scale_input.text().replace('，', ',').split(',') if text.strip()]
+        except ValueError:
+            return []
+        if not base or any(scale <= 0 for scale in scales):
+            return []
+        return [(f"{base}{'' if scale == 1 else f'_{scale:g}x'}.{ext}", scale)
+                for scale in scales for ext, box in self.format_boxes.items() if box.isChecked()]
 
 
 class MainWindow(QMainWindow):
@@ -301,11 +1169,31 @@ class MainWindow(QMainWindow):
         self.canvas = MyCanvas(self)
         self.canvas.statusBar = self.statusBar  # 关联状态栏
 
-        # 图元列表
-        self.list_widget = QListWidget()
-        self.list_widget.setMinimumWidth(150)
-        self.list_widget.setWindowTitle("图元列表")
-        self.canvas.set_list_widget(self.list_widget)
+        # 图元列表（模型/视图，行高统一，大量图元时只布局可见行）
+        self.list_view = QListView()
+        self.list_view.setUniformItemSizes(True)
+        self.list_view.setMinimumWidth(150)
+        self.list_view.setWindowTitle("图元列表")
+        self.canvas.set_list_view(self.list_view)
+
+        # 加载进度
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setMaximumWidth(200)
+        self.progress_bar.hide()
+        self.statusBar.addPermanentWidget(self.progress_bar)
+
+        # 导出进度，可取消
+        self.export_progress = QProgressBar()
+        self.export_progress.setMaximumWidth(200)
+        self.export_progress.hide()
+        self.export_cancel_btn = QPushButton("取消导出")
+        self.export_cancel_btn.hide()
+        self.export_cancel_btn.clicked.connect(self.cancel_export)
+        self.statusBar.addPermanentWidget(self.export_progress)
+        self.statusBar.addPermanentWidget(self.export_cancel_btn)
+
+        # 菜单栏
+        self.create_menu()
 
         # 控制面板
         control_panel = self.create_control_panel()
@@ -314,12 +1202,51 @@ class MainWindow(QMainWindow):
         main_layout = QHBoxLayout()
         main_layout.addWidget(control_panel, 1)
         main_layout.addWidget(self.canvas, 5)
-        main_layout.addWidget(self.list_widget, 1)
+        main_layout.addWidget(self.list_view, 1)
 
         central_widget = QWidget()
         central_widget.setLayout(main_layout)
         self.setCentralWidget(central_widget)
 
+    def create_menu(self):
+        """创建菜单栏：文件菜单（指令文件、场景快照）、编辑菜单（撤销/重做/删除）和视图菜单"""
+        file_menu = self.menuBar().addMenu("文件")
+        open_commands_action = QAction("打开指令文件", self)
+        open_commands_action.triggered.connect(self.open_command_file_dialog)
+        file_menu.addAction(open_commands_action)
+        load_scene_action = QAction("加载场景", self)
+        load_scene_action.triggered.connect(self.load_scene_dialog)
+        file_menu.addAction(load_scene_action)
+        save_scene_action = QAction("保存场景", self)
+        save_scene_action.triggered.connect(self.save_scene_dialog)
+        file_menu.addAction(save_scene_action)
+        export_action = QAction("导出画布", self)
+        export_action.triggered.connect(self.export_dialog)
+        file_menu.addAction(export_action)
+
+        edit_menu = self.menuBar().addMenu("编辑")
+        undo_action = QAction("撤销", self)
+        undo_action.setShortcut(QKeySequence.Undo)
+        undo_action.triggered.connect(self.canvas.undo)
+        edit_menu.addAction(undo_action)
+        redo_action = QAction("重做", self)
+        redo_action.setShortcut(QKeySequence.Redo)
+        redo_action.triggered.connect(self.canvas.redo)
+        edit_menu.addAction(redo_action)
+        delete_action = QAction("删除选中图元", self)
+        delete_action.setShortcut(QKeySequence.Delete)
+        delete_action.triggered.connect(self.canvas.delete_selected)
+        edit_menu.addAction(delete_action)
+
+        view_menu = self.menuBar().addMenu("视图")
+        raster_action = QAction("光栅合成模式", self)
+        raster_action.setCheckable(True)
+        raster_action.toggled.connect(self.canvas.set_raster_mode)
+        view_menu.addAction(raster_action)
+        reset_zoom_action = QAction("重置缩放", self)
+        reset_zoom_action.triggered.connect(self.canvas.reset_zoom)
+        view_menu.addAction(reset_zoom_action)
+
     def create_control_panel(self):
         """创建控制面板（按钮、输入框等）"""
         panel = QWidget()
@@ -433,17 +1360,99 @@ class MainWindow(QMainWindow):
         if ok1:
             height, ok2 = QInputDialog.getInt(self, "画布高度", "请输入高度(100-1000):", 600, 100, 1000)
             if ok2:
+                self.canvas.cancel_loading()
                 self.canvas.reset_canvas(width, height)
 
     def save_canvas_dialog(self):
         """保存画布对话框"""
         path, _ = QFileDialog.getSaveFileName(self, "保存画布", "", "BMP文件 (*.bmp)")
         if path:
-            self.canvas.save_canvas(path)
+            if not path.lower().endswith('.bmp'):
+                path += '.bmp'
+            self.export_canvas([(path, 1.0)])
+
+    def export_dialog(self):
+        """导出画布对话框（多种格式和尺寸）"""
+        dialog = ExportDialog(self)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        targets = dialog.targets()
+        if not targets:
+            self.statusBar.showMessage("请填写文件名、至少选择一种格式，比例须为正数")
+            return
+        self.export_canvas(targets)
+
+    def export_canvas(self, targets: List[Tuple[str, float]]):
+        """在后台导出画布，状态栏显示进度和取消按钮"""
+        self.export_progress.setValue(0)
+        self.export_progress.show()
+        self.export_cancel_btn.show()
+        self.canvas.export_canvas(targets, self.on_export_progress, self.on_export_finished)
+
+    def on_export_progress(self, done: int, total: int):
+        self.export_progress.setMaximum(max(total, 1))
+        self.export_progress.setValue(done)
+
+    def on_export_finished(self):
+        # 已被新的导出替换的线程结束时不隐藏进度
+        if self.canvas.exporter is None or self.sender() is self.canvas.exporter:
+            self.export_progress.hide()
+            self.export_cancel_btn.hide()
+
+    def cancel_export(self):
+        self.canvas.cancel_export()
+        self.on_export_finished()
+
+    def closeEvent(self, event):
+        # 工作线程必须在窗口销毁前退出
+        self.canvas.cancel_export()
+        super().closeEvent(event)
+
+    def open_command_file_dialog(self):
+        """打开cg_cli指令文件对话框"""
+        path, _ = QFileDialog.getOpenFileName(self, "打开指令文件", "", "指令文件 (*.txt);;所有文件 (*)")
+        if path:
+            self.open_command_file(path)
+
+    def open_command_file(self, path: str):
+        """在后台分批加载指令文件，状态栏显示进度"""
+        loader = self.canvas.open_command_file(path)
+        self.progress_bar.setValue(0)
+        self.progress_bar.show()
+        loader.progress.connect(self.on_load_progress)
+        loader.finished.connect(self.progress_bar.hide)
+        loader.failed.connect(self.progress_bar.hide)
+
+    def on_load_progress(self, done: int, total: int):
+        self.progress_bar.setMaximum(max(total, 1))
+        self.progress_bar.setValue(done)
+
+    def save_scene_dialog(self):
+        """保存场景快照对话框"""
+        path, _ = QFileDialog.getSaveFileName(self, "保存场景", "", f"场景快照 (*{cg_scene.SNAPSHOT_EXT})")
+        if path:
+            self.canvas.save_scene(path)
+
+    def load_scene_dialog(self):
+        """加载场景快照对话框"""
+        path, _ = QFileDialog.getOpenFileName(self, "加载场景", "", f"场景快照 (*{cg_scene.SNAPSHOT_EXT})")
+        if path:
+            self.canvas.load_scene(path)
 
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
+    if '--backend' in sys.argv[1:-1]:
+        # 光栅化后端，默认由环境变量CG_BACKEND指定
+        set_backend(sys.argv[sys.argv.index('--backend') + 1])
     window = MainWindow()
+    recorder = None
+    if '--record' in sys.argv[1:-1]:
+        # 录制交互轨迹，用 cg_trace.py 回放
+        from cg_trace import TraceRecorder
+        recorder = TraceRecorder(window, sys.argv[sys.argv.index('--record') + 1])
     window.show()
-    sys.exit(app.exec_())
\ No newline at end of file
+    code = app.exec_()
+    if recorder is not None:
+        recorder.close()
+    sys.exit(code)
\ No newline at end of file
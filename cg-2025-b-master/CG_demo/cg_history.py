@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# 撤销/重做日志：只记录紧凑的操作，不保存整个场景的快照
+#
+# 每条记录都是“执行后即可撤销某次编辑”的操作，执行时返回它的逆操作放入另一个栈：
+#   AddItem        重新加入图元（撤销删除），保存该图元的控制点
+#   RemoveItem     删除图元（撤销创建）
+#   TransformItem  对一个图元的控制点应用 3x3 仿射矩阵（撤销一次拖动），
+#                  核心算法逐步取整造成的偏差另存为很小的整数残差，保证撤销后控制点完全一致
+#
+# 日志只通过下列方法操作画布（由MyCanvas实现）：
+#   restore_item(record)            按记录重新加入图元
+#   remove_item(item_id)            删除图元
+#   item_points(item_id)            图元当前的控制点
+#   apply_geometry(item_id, p_list) 只更新该图元的控制点
+import time
+from collections import deque
+import numpy as np
+
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024  # 日志默认内存上限
+COALESCE_INTERVAL = 1.0  # 对同一图元连续做同一种操作、两次拖动间隔不超过该时间（秒）时合并为一条记录
+ENTRY_OVERHEAD = 128     # 每条记录对象本身的估计字节数
+
+
+def qtransform_matrix(transform):
+    """把QTransform（行向量约定）转换为作用于列向量 (x, y, 1) 的 3x3 矩阵"""
+    return np.array([[transform.m11(), transform.m21(), transform.dx()],
+                     [transform.m12(), transform.m22(), transform.dy()],
+                     [0.0, 0.0, 1.0]])
+
+
+def _as_points(p_list):
+    """控制点列表转换为 (N, 2) 的int32数组"""
+    return np.array(p_list or [], np.int32).reshape(-1, 2)
+
+
+def _apply_matrix(matrix, points):
+    """对整数点应用仿射矩阵并四舍五入"""
+    return np.rint(points @ matrix[:2, :2].T + matrix[:2, 2]).astype(np.int64)
+
+
+def _inverse(matrix):
+    """仿射矩阵的逆，不可逆（如缩放为0）时返回None"""
+    if abs(np.linalg.det(matrix[:2, :2])) < 1e-12:
+        return None
+    return np.linalg.inv(matrix)
+
+
+def _compact(residual):
+    """用能容纳残差的最小整数类型保存残差，全为0时不保存"""
+    if not residual.any():
+        return None
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if residual.min() >= info.min and residual.max() <= info.max:
+            return residual.astype(dtype)
+    return residual
+
+
+class ItemRecord:
+    """重新创建图元所需的全部参数"""
+    __slots__ = ('item_id', 'item_type', 'points', 'algorithm', 'color', 'serial', 'row')
+
+    def __init__(self, item_id, item_type, p_list, algorithm, color, serial, row):
+        """
+        :param item_id: (string) 图元ID
+        :param item_type: (string) 图元类型
+        :param p_list: (list of list of int) 控制点
+        :param algorithm: (string) 绘制算法
+        :param color: (tuple of int) 颜色
+        :param serial: (int) 图元的添加顺序，恢复后保持原来的上下层次
+        :param row: (int) 图元在列表中的行
+        """
+        self.item_id = item_id
+        self.item_type = item_type
+        self.points = _as_points(p_list)
+        self.algorithm = algorithm
+        self.color = tuple(int(c) for c in color)
+        self.serial = serial
+        self.row = row
+
+    @property
+    def p_list(self):
+        return self.points.tolist()
+
+    @property
+    def nbytes(self):
+        return ENTRY_OVERHEAD + self.points.nbytes + len(self.item_id) + len(self.algorithm)
+
+
+class _ItemEntry:
+    """加入/删除图元的公共部分"""
+    __slots__ = ('record',)
+
+    def __init__(self, record):
+        self.record = record
+
+    @property
+    def item_id(self):
+        return self.record.item_id
+
+    @property
+    def nbytes(self):
+        return self.record.nbytes
+
+
+class AddItem(_ItemEntry):
+    """重新加入图元"""
+    __slots__ = ()
+
+    def apply(self, target):
+        target.restore_item(self.record)
+        return RemoveItem(self.record)
+
+
+class RemoveItem(_ItemEntry):
+    """删除图元"""
+    __slots__ = ()
+
+    def apply(self, target):
+        target.remove_item(self.record.item_id)
+        return AddItem(self.record)
+
+
+class TransformItem:
+    """把图元的控制点p变换为 round(matrix · p) + residual"""
+    __slots__ = ('item_id', 'matrix', 'residual')
+
+    def __init__(self, item_id, matrix, residual):
+        self.item_id = item_id
+        self.matrix = matrix
+        self.residual = residual
+
+    @classmethod
+    def between(cls, item_id, matrix, source, target):
+        """构造把控制点source变换为target的操作，matrix为None（不可逆）时残差直接保存target
+
+        :param matrix: (numpy.ndarray 或 None) 近似的 3x3 仿射矩阵
+        :param source: (list of list of int) 变换前的控制点
+        :param target: (list of list of int) 变换后的控制点
+        """
+        if matrix is None:
+            matrix = np.zeros((3, 3))
+        residual = _as_points(target).astype(np.int64) - _apply_matrix(matrix, _as_points(source))
+        return cls(item_id, matrix, _compact(residual))
+
+    @property
+    def nbytes(self):
+        return ENTRY_OVERHEAD + self.matrix.nbytes + (0 if self.residual is None else self.residual.nbytes)
+
+    def transform(self, p_list):
+        points = _apply_matrix(self.matrix, _as_points(p_list))
+        if self.residual is not None:
+            points += self.residual
+        return points.tolist()
+
+    def apply(self, target):
+        source = target.item_points(self.item_id)
+        result = self.transform(source)
+        target.apply_geometry(self.item_id, result)
+        return TransformItem.between(self.item_id, _inverse(self.matrix), result, source)
+
+
+class EditJournal:
+    """撤销/重做日志，两个栈的总大小不超过max_bytes（超出时丢弃最早的记录）"""
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, coalesce_interval=COALESCE_INTERVAL):
+        self.undo_stack = deque()
+        self.redo_stack = deque()
+        self.nbytes = 0
+        self._max_bytes = max_bytes
+        self.coalesce_interval = coalesce_interval
+        self._last_transform = None  # 上一次拖动的 (图元ID, 操作, 时间)，记录了其他编辑或撤销/重做后不再合并
+
+    def __len__(self):
+        return len(self.undo_stack) + len(self.redo_stack)
+
+    @property
+    def max_bytes(self):
+        return self._max_bytes
+
+    @max_bytes.setter
+    def max_bytes(self, max_bytes):
+        self._max_bytes = max_bytes
+        self._trim()
+
+    def can_undo(self):
+        return bool(self.undo_stack)
+
+    def can_redo(self):
+        return bool(self.redo_stack)
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.nbytes = 0
+        self._last_transform = None
+
+    def record_created(self, record):
+        """记录新建的图元（撤销时删除）"""
+        self._push(RemoveItem(record))
+        self._last_transform = None
+
+    def record_deleted(self, record):
+        """记录删除的图元（撤销时重新加入）"""
+        self._push(AddItem(record))
+        self._last_transform = None
+
+    def record_transform(self, item_id, matrix, before, after, operation=None):
+        """记录一次拖动对图元的变换
+
+        一次拖动本身总是一条记录；只有对同一图元连续做同一种操作（例如几次短促的平移微调）、
+        且间隔不超过coalesce_interval时才与上一条合并，不同操作、不同图元或中间有其他编辑时各自成为一条记录
+        :param item_id: (string) 图元ID
+        :param matrix: (numpy.ndarray) 本次拖动的 3x3 仿射矩阵
+        :param before: (list of list of int) 拖动前的控制点
+        :param after: (list of list of int) 拖动后的控制点
+        :param operation: (string) 操作名称（translate/rotate/scale），为None时不与其他拖动合并
+        """
+        now = time.monotonic()
+        top = self.undo_stack[-1] if self.undo_stack else None
+        last = self._last_transform
+        if (operation is not None and isinstance(top, TransformItem) and last is not None
+                and last[:2] == (item_id, operation) and now - last[2] <= self.coalesce_interval):
+            # 合并：上一条记录把before还原为更早的控制点，新记录直接把after还原为它
+            self._pop_undo()
+            origin = top.transform(before)
+            inverse = _inverse(matrix)
+            if inverse is not None:
+                inverse = top.matrix @ inverse
+            entry = TransformItem.between(item_id, inverse, after, origin)
+        else:
+            entry = TransformItem.between(item_id, _inverse(matrix), after, before)
+        self._push(entry)
+        self._last_transform = (item_id, operation, now)
+
+    def undo(self, target):
+        """撤销最近一次编辑，返回受影响的图元ID，没有可撤销的编辑时返回None"""
+        if not self.undo_stack:
+            return None
+        entry = self._pop_undo()
+        self._push_redo(entry.apply(target))
+        self._last_transform = None
+        return entry.item_id
+
+    def redo(self, target):
+        """重做最近一次撤销的编辑，返回受影响的图元ID，没有可重做的编辑时返回None"""
+        if not self.redo_stack:
+            return None
+        entry = self.redo_stack.pop()
+        self.nbytes -= entry.nbytes
+        self.undo_stack.append(entry.apply(target))
+        self.nbytes += self.undo_stack[-1].nbytes
+        self._last_transform = None
+        self._trim()
+        return entry.item_id
+
+    def _push(self, entry):
+        """加入新的编辑，之后的重做记录全部失效"""
+        for stale in self.redo_stack:
+            self.nbytes -= stale.nbytes
+        self.redo_stack.clear()
+        self.undo_stack.append(entry)
+        self.nbytes += entry.nbytes
+        self._trim()
+
+    def _push_redo(self, entry):
+        self.redo_stack.append(entry)
+        self.nbytes += entry.nbytes
+        self._trim()
+
+    def _pop_undo(self):
+        entry = self.undo_stack.pop()
+        self.nbytes -= entry.nbytes
+        return entry
+
+    def _trim(self):
+        """超出内存上限时先丢弃最早的撤销记录，再丢弃最远的重做记录"""
+        while self.nbytes > self._max_bytes and (self.undo_stack or self.redo_stack):
+            stack = self.undo_stack if self.undo_stack else self.redo_stack
+            self.nbytes -= stack.popleft().nbytes
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# 多层均匀网格空间索引：按包围盒把键登记到覆盖的网格单元中，
+# 点查询在每一层只需访问一个单元，与图元总数无关。
+# 第k层的单元边长为 cell_size * LEVEL_FACTOR**k，每个键登记在覆盖单元数不超过MAX_ITEM_CELLS的最细一层，
+# 所以登记一个键的开销与它的面积无关（50k×50k画布上的一条对角线也只占几个单元）
+import math
+
+DEFAULT_CELL_SIZE = 64  # 最细一层网格单元的边长（像素）
+LEVEL_FACTOR = 8        # 相邻两层单元边长的倍数
+MAX_ITEM_CELLS = 64     # 一个键在所在层最多覆盖的单元数，超过时登记到更粗的一层
+
+
+class GridIndex:
+    """多层均匀网格索引，键可以是任意可哈希对象"""
+    def __init__(self, cell_size: int = DEFAULT_CELL_SIZE):
+        self.cell_size = cell_size
+        self._levels = []  # 每层一个字典：(cx, cy) -> 键集合
+        self._bounds = {}  # 键 -> (x0, y0, x1, y1)
+        self._level_of = {}  # 键 -> 所在层
+
+    def __len__(self):
+        return len(self._bounds)
+
+    def __contains__(self, key):
+        return key in self._bounds
+
+    def _cell_range(self, level, x0, y0, x1, y1):
+        size = self.cell_size * LEVEL_FACTOR ** level
+        return (math.floor(x0 / size), math.floor(y0 / size),
+                math.floor(x1 / size), math.floor(y1 / size))
+
+    def insert(self, key, bounds):
+        """登记键的包围盒 (x0, y0, x1, y1)，已存在时先移除旧的登记"""
+        if key in self._bounds:
+            self.remove(key)
+        level = 0
+        while True:
+            cx0, cy0, cx1, cy1 = self._cell_range(level, *bounds)
+            if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) <= MAX_ITEM_CELLS:
+                break
+            level += 1
+        while len(self._levels) <= level:
+            self._levels.append({})
+        cells = self._levels[level]
+        self._bounds[key] = bounds
+        self._level_of[key] = level
+        for cy in range(cy0, cy1 + 1):
+            for cx in range(cx0, cx1 + 1):
+                cells.setdefault((cx, cy), set()).add(key)
+
+    def remove(self, key):
+        """移除键，不存在时忽略"""
+        bounds = self._bounds.pop(key, None)
+        if bounds is None:
+            return
+        level = self._level_of.pop(key)
+        cells = self._levels[level]
+        cx0, cy0, cx1, cy1 = self._cell_range(level, *bounds)
+        for cy in range(cy0, cy1 + 1):
+            for cx in range(cx0, cx1 + 1):
+                cell = cells.get((cx, cy))
+                if cell is not None:
+                    cell.discard(key)
+                    if not cell:
+                        del cells[(cx, cy)]
+
+    def clear(self):
+        self._levels.clear()
+        self._bounds.clear()
+        self._level_of.clear()
+
+    def bounds(self, key):
+        """键登记的包围盒"""
+        return self._bounds[key]
+
+    def _keys_in_cells(self, level, cx0, cy0, cx1, cy1):
+        """第level层中单元范围 [cx0, cx1]×[cy0, cy1] 内登记的键（可能重复）"""
+        cells = self._levels[level]
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(cells):
+            # 查询范围比已占用的单元还多：直接遍历已占用的单元，开销不随查询面积增长
+            for (cx, cy), keys in cells.items():
+                if cx0 <= cx <= cx1 and cy0 <= cy <= cy1:
+                    yield from keys
+            return
+        for cy in range(cy0, cy1 + 1):
+            for cx in range(cx0, cx1 + 1):
+                yield from cells.get((cx, cy), ())
+
+    def query_point(self, x, y, tolerance=0):
+        """返回包围盒（向外扩展tolerance）包含点(x, y)的全部键"""
+        result = set()
+        for level in range(len(self._levels)):
+            cell_range = self._cell_range(level, x - tolerance, y - tolerance, x + tolerance, y + tolerance)
+            for key in self._keys_in_cells(level, *cell_range):
+                x0, y0, x1, y1 = self._bounds[key]
+                if x0 - tolerance <= x <= x1 + tolerance and y0 - tolerance <= y <= y1 + tolerance:
+                    result.add(key)
+        return result
+
+    def query_rect(self, x0, y0, x1, y1):
+        """返回包围盒与矩形 (x0, y0, x1, y1) 相交的全部键"""
+        result = set()
+        for level in range(len(self._levels)):
+            for key in self._keys_in_cells(level, *self._cell_range(level, x0, y0, x1, y1)):
+                bx0, by0, bx1, by1 = self._bounds[key]
+                if bx0 <= x1 and x0 <= bx1 and by0 <= y1 and y0 <= by1:
+                    result.add(key)
+        return result
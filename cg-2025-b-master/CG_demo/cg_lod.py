@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# 细节层次（LOD）：缩小显示时在缩小后的坐标系中光栅化图元，
+# 多边形用Douglas-Peucker算法简化顶点，曲线按屏幕上的长度减少采样点
+import math
+from cg_backends import current_backend
+
+MAX_LOD_LEVEL = 8        # 最多缩小到 1/2^8
+SIMPLIFY_EPSILON = 0.5   # 简化容差（缩小后坐标系中的像素）
+
+
+def lod_level(scale):
+    """把视图缩放比例映射到LOD等级：scale >= 1 时为0（全细节），否则为 floor(-log2(scale))"""
+    if scale >= 1:
+        return 0
+    return min(MAX_LOD_LEVEL, int(math.floor(-math.log2(scale))))
+
+
+def douglas_peucker(points, epsilon):
+    """Douglas-Peucker折线简化，保留首末点
+
+    :param points: (list of list of number) 折线顶点
+    :param epsilon: (float) 被删除的顶点到简化后折线的最大距离
+    :return: (list of list of number) 简化后的顶点
+    """
+    if len(points) < 3:
+        return list(points)
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        x0, y0 = points[first]
+        x1, y1 = points[last]
+        dx, dy = x1 - x0, y1 - y0
+        length = math.hypot(dx, dy)
+        max_dist, index = -1.0, first
+        for i in range(first + 1, last):
+            px, py = points[i]
+            if length == 0:
+                dist = math.hypot(px - x0, py - y0)
+            else:
+                dist = abs(dy * (px - x0) - dx * (py - y0)) / length
+            if dist > max_dist:
+                max_dist, index = dist, i
+        if max_dist > epsilon:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return [p for p, k in zip(points, keep) if k]
+
+
+def simplify_polygon(p_list, epsilon):
+    """简化闭合多边形，顶点不足3个时保留原多边形"""
+    simplified = douglas_peucker(p_list + [p_list[0]], epsilon)[:-1]
+    return simplified if len(simplified) >= 3 else p_list
+
+
+def curve_samples(p_list, algorithm, factor):
+    """缩小factor倍后曲线每段所需的采样点数：控制多边形长度是曲线长度的上界，约每像素一个采样点"""
+    length = sum(math.hypot(x1 - x0, y1 - y0) for (x0, y0), (x1, y1) in zip(p_list, p_list[1:]))
+    segments = len(p_list) - 3 if algorithm == 'B-spline' else 1
+    return max(2, min(50, math.ceil(length * factor / max(segments, 1))))
+
+
+def lod_pixels(item_type, p_list, algorithm, level):
+    """在缩小 2^level 倍的坐标系中光栅化图元
+
+    :return: (list of list of int 或 numpy.ndarray) 缩小后坐标系中的像素点，绘制时需放大 2^level 倍
+    """
+    backend = current_backend()
+    factor = 0.5 ** level
+    scaled = [[round(x * factor), round(y * factor)] for x, y in p_list]
+    if item_type == 'line':
+        return backend.draw_line(scaled, algorithm)
+    elif item_type == 'polygon':
+        return backend.draw_polygon(simplify_polygon(scaled, SIMPLIFY_EPSILON), algorithm)
+    elif item_type == 'ellipse':
+        return backend.draw_ellipse(scaled)
+    elif item_type == 'curve':
+        # 曲线在原坐标系中计算采样点，避免控制点取整造成形变
+        samples = curve_samples(p_list, algorithm, factor)
+        return [[round(x * factor), round(y * factor)]
+                for x, y in backend.draw_curve(p_list, algorithm, samples)]
+    return []
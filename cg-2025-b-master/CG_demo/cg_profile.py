@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# cg_cli的性能剖析：按指令类型和图元类型统计耗时，记录生成的像素数、每次saveCanvas实际光栅化的图元数、
+# 画布内存峰值和图像写出耗时；未开启时cg_cli不创建Profiler，执行路径与原来相同
+import io
+import time
+import pstats
+import cProfile
+
+
+class Profiler:
+    """收集一次cg_cli运行的统计数据"""
+    def __init__(self, profile_draw=False):
+        """
+        :param profile_draw: (bool) 是否用cProfile记录draw_*调用内部的函数耗时
+        """
+        self.commands = {}    # 指令 -> {'count', 'seconds'}
+        self.primitives = {}  # 图元类型 -> {'count', 'seconds', 'pixels'}
+        self.saves = []       # 每次saveCanvas的统计
+        self.peak_canvas_bytes = 0
+        self.total_seconds = 0.0
+        self.draw_profile = cProfile.Profile() if profile_draw else None
+
+    def record_command(self, command, seconds):
+        entry = self.commands.setdefault(command, {'count': 0, 'seconds': 0.0})
+        entry['count'] += 1
+        entry['seconds'] += seconds
+
+    def timed_draw(self, draw):
+        """包装cg_cli.draw_item：按图元类型累计耗时和像素数，合成时代替原函数
+
+        返回的函数用calls属性记录被调用的次数，即这次合成实际光栅化的图元数（被裁剪掉的图元不会调用）
+        """
+        def timed(item_type, p_list, algorithm):
+            timed.calls += 1
+            if self.draw_profile is not None:
+                self.draw_profile.enable()
+            start = time.perf_counter()
+            pixels = draw(item_type, p_list, algorithm)
+            seconds = time.perf_counter() - start
+            if self.draw_profile is not None:
+                self.draw_profile.disable()
+            entry = self.primitives.setdefault(item_type, {'count': 0, 'seconds': 0.0, 'pixels': 0})
+            entry['count'] += 1
+            entry['seconds'] += seconds
+            entry['pixels'] += len(pixels)
+            return pixels
+        timed.calls = 0
+        return timed
+
+    def record_save(self, name, items, canvas_bytes, composite_seconds, save_seconds):
+        """记录一次saveCanvas
+
+        :param name: (string) 图像名
+        :param items: (int) 实际光栅化的图元数
+        :param canvas_bytes: (int) 画布占用的内存
+        :param composite_seconds: (float) 合成耗时（含光栅化）
+        :param save_seconds: (float) 写出图像的耗时
+        """
+        self.peak_canvas_bytes = max(self.peak_canvas_bytes, canvas_bytes)
+        self.saves.append({'name': name, 'items': items, 'canvas_bytes': canvas_bytes,
+                           'composite_seconds': composite_seconds, 'save_seconds': save_seconds})
+
+    def draw_stats(self, limit=15):
+        """cProfile记录中累计耗时最多的limit个函数（文本）"""
+        if self.draw_profile is None:
+            return ''
+        stream = io.StringIO()
+        pstats.Stats(self.draw_profile, stream=stream).sort_stats('cumulative').print_stats(limit)
+        return stream.getvalue()
+
+    def report(self):
+        """JSON可序列化的统计结果"""
+        draw_seconds = sum(entry['seconds'] for entry in self.primitives.values())
+        save_seconds = sum(save['save_seconds'] for save in self.saves)
+        composite_seconds = sum(save['composite_seconds'] for save in self.saves)
+        return {
+            'total_seconds': self.total_seconds,
+            'draw_seconds': draw_seconds,
+            # 合成耗时中除光栅化以外的部分：坐标转换和写入画布
+            'blit_seconds': composite_seconds - draw_seconds,
+            'image_save_seconds': save_seconds,
+            'peak_canvas_bytes': self.peak_canvas_bytes,
+            'pixels': sum(entry['pixels'] for entry in self.primitives.values()),
+            'commands': self.commands,
+            'primitives': self.primitives,
+            'saves': self.saves,
+        }
+
+    def summary(self):
+        """可读的统计摘要"""
+        report = self.report()
+        total = report['total_seconds'] or 1.0
+        lines = [f"总耗时 {report['total_seconds']:.3f}s：光栅化 {report['draw_seconds']:.3f}s，"
+                 f"写入画布 {report['blit_seconds']:.3f}s，写出图像 {report['image_save_seconds']:.3f}s，"
+                 f"画布内存峰值 {report['peak_canvas_bytes'] / 2 ** 20:.1f}MB",
+                 '', f"{'指令':16s}{'次数':>10s}{'耗时(s)':>12s}{'占比':>8s}"]
+        for command, entry in sorted(self.commands.items(), key=lambda kv: -kv[1]['seconds']):
+            lines.append(f"{command:16s}{entry['count']:10d}{entry['seconds']:12.4f}"
+                         f"{entry['seconds'] / total:8.1%}")
+        lines += ['', f"{'图元':16s}{'次数':>10s}{'耗时(s)':>12s}{'像素':>12s}{'像素/秒':>14s}"]
+        for item_type, entry in sorted(self.primitives.items(), key=lambda kv: -kv[1]['seconds']):
+            rate = entry['pixels'] / entry['seconds'] if entry['seconds'] else 0
+            lines.append(f"{item_type:16s}{entry['count']:10d}{entry['seconds']:12.4f}"
+                         f"{entry['pixels']:12d}{rate:14.0f}")
+        if self.saves:
+            lines += ['', f"{'saveCanvas':16s}{'图元':>10s}{'合成(s)':>12s}{'写出(s)':>12s}"]
+            for save in self.saves:
+                lines.append(f"{save['name']:16s}{save['items']:10d}{save['composite_seconds']:12.4f}"
+                             f"{save['save_seconds']:12.4f}")
+        stats = self.draw_stats()
+        if stats:
+            lines += ['', 'draw_* 内部耗时（cProfile）：', stats.rstrip()]
+        return '\n'.join(lines)
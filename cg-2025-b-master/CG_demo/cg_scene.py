@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# 场景快照：把图元字典、画布尺寸和画笔颜色保存为紧凑的二进制文件
+#
+# 文件布局（小端序，每一段都按8字节对齐，便于内存映射后直接按类型解释）：
+#   文件头  SNAPSHOT_HEADER
+#   types       uint8[n]       图元类型编号（ITEM_TYPES下标）
+#   algorithms  uint8[n]       算法编号（names中的下标）
+#   colors      uint8[n, 3]    图元颜色
+#   offsets     int64[n + 1]   每个图元控制点在points中的起止位置
+#   points      int32[m, 2]    全部控制点
+#   names       bytes          以换行分隔的算法名称表（UTF-8），CLI接受任意算法名，所以不用固定编号
+#   ids         bytes          以换行分隔的图元ID（UTF-8）
+import os
+import struct
+import numpy as np
+
+SNAPSHOT_MAGIC = b'CGSN'
+SNAPSHOT_VERSION = 2
+SNAPSHOT_EXT = '.cgs'
+# 魔数、版本、宽、高、画笔颜色、图元数、控制点数、算法名称表字节数、ID字节数
+SNAPSHOT_HEADER = struct.Struct('<4sHii3BxqqQQ')
+MAX_ALGORITHMS = 256  # 算法编号为uint8
+
+ITEM_TYPES = ('line', 'polygon', 'ellipse', 'curve')
+
+
+def _align(size):
+    """向上取8的倍数"""
+    return (size + 7) & ~7
+
+
+def _write_section(fp, array):
+    """整块写出数组并补齐到8字节边界"""
+    data = np.ascontiguousarray(array).tobytes()
+    fp.write(data)
+    fp.write(b'\0' * (_align(len(data)) - len(data)))
+
+
+def save_scene(path, item_dict, width, height, pen_color):
+    """保存场景快照
+
+    :param path: (string) 快照文件路径
+    :param item_dict: (dict of id: [类型, 控制点, 算法, 颜色]) 图元字典，按插入顺序保存
+    :param width: (int) 画布宽度
+    :param height: (int) 画布高度
+    :param pen_color: (list of int: [R, G, B]) 当前画笔颜色
+    """
+    n = len(item_dict)
+    types = np.empty(n, np.uint8)
+    algorithms = np.empty(n, np.uint8)
+    colors = np.empty((n, 3), np.uint8)
+    offsets = np.zeros(n + 1, np.int64)
+    coords = []
+    names = {}  # 算法名称 -> 编号，按首次出现的顺序编号
+    for i, (item_type, p_list, algorithm, color) in enumerate(item_dict.values()):
+        # 被裁剪掉的图元控制点可能为None，按空列表保存
+        p_list = p_list or []
+        if item_type not in ITEM_TYPES:
+            raise ValueError(f"无法保存未知类型的图元：{item_type}")
+        if algorithm not in names:
+            if '\n' in algorithm:
+                raise ValueError(f"算法名称不能包含换行：{algorithm!r}")
+            if len(names) == MAX_ALGORITHMS:
+                raise ValueError(f"场景中的算法名称超过{MAX_ALGORITHMS}种，无法保存")
+            names[algorithm] = len(names)
+        types[i] = ITEM_TYPES.index(item_type)
+        algorithms[i] = names[algorithm]
+        colors[i] = color
+        offsets[i + 1] = offsets[i] + len(p_list)
+        coords.extend(p_list)
+    points = np.array(coords, np.int32).reshape(-1, 2)
+    name_table = '\n'.join(names).encode('utf-8')
+    ids = '\n'.join(item_dict.keys()).encode('utf-8')
+    r, g, b = (int(c) for c in pen_color)
+    with open(path, 'wb') as fp:
+        fp.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, width, height,
+                                      r, g, b, n, len(points), len(name_table), len(ids)))
+        fp.write(b'\0' * (_align(SNAPSHOT_HEADER.size) - SNAPSHOT_HEADER.size))
+        for array in (types, algorithms, colors, offsets, points, np.frombuffer(name_table, np.uint8)):
+            _write_section(fp, array)
+        fp.write(ids)
+
+
+def load_scene(path):
+    """以内存映射方式读取场景快照
+
+    :param path: (string) 快照文件路径
+    :return: (tuple: (item_dict, width, height, pen_color)) 图元字典的格式与save_scene相同，
+        颜色为numpy数组
+    :raises ValueError: 不是场景快照、版本不支持，或者文件被截断/损坏
+    """
+    file_size = os.path.getsize(path)
+    if file_size < SNAPSHOT_HEADER.size:
+        raise ValueError(f"{path} 不是场景快照文件")
+    data = np.memmap(path, dtype=np.uint8, mode='r')
+    magic, version, width, height, r, g, b, n, m, names_size, ids_size = \
+        SNAPSHOT_HEADER.unpack_from(data[:SNAPSHOT_HEADER.size].tobytes())
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError(f"{path} 不是场景快照文件")
+    if version != SNAPSHOT_VERSION:
+        raise ValueError(f"不支持的快照版本：{version}")
+    if n < 0 or m < 0:
+        raise ValueError(f"{path} 已损坏：图元数或控制点数为负")
+    # 先按文件头算出各段的位置并与文件长度核对，截断的文件不会切出错位或不完整的数组
+    layout = []
+    pos = _align(SNAPSHOT_HEADER.size)
+    for dtype, shape in ((np.uint8, (n,)), (np.uint8, (n,)), (np.uint8, (n, 3)),
+                         (np.int64, (n + 1,)), (np.int32, (m, 2)), (np.uint8, (names_size,))):
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        layout.append((pos, size, dtype, shape))
+        pos += _align(size)
+    if pos + ids_size != file_size:
+        raise ValueError(f"{path} 已损坏：按文件头应有 {pos + ids_size} 字节，实际为 {file_size} 字节")
+    types, algorithms, colors, offsets, points, name_table = \
+        [data[start:start + size].view(dtype).reshape(shape) for start, size, dtype, shape in layout]
+    names = name_table.tobytes().decode('utf-8').split('\n')
+    ids = data[pos:pos + ids_size].tobytes().decode('utf-8').split('\n') if n else []
+    if len(ids) != n:
+        raise ValueError(f"{path} 已损坏：有 {n} 个图元，却有 {len(ids)} 个图元ID")
+    if n and (int(types.max()) >= len(ITEM_TYPES) or int(algorithms.max()) >= len(names)):
+        raise ValueError(f"{path} 已损坏：图元类型或算法编号越界")
+    if offsets[0] != 0 or offsets[-1] != m or (np.diff(offsets) < 0).any():
+        raise ValueError(f"{path} 已损坏：控制点的起止位置不正确")
+    # 一次性转换为Python列表，核心算法要求控制点为list of list
+    types = types.tolist()
+    algorithms = algorithms.tolist()
+    offsets = offsets.tolist()
+    colors = np.array(colors)
+    points = points.tolist()
+    item_dict = {}
+    for i in range(n):
+        item_dict[ids[i]] = [ITEM_TYPES[types[i]], points[offsets[i]:offsets[i + 1]],
+                             names[algorithms[i]], colors[i]]
+    del data
+    return item_dict, width, height, np.array([r, g, b], np.uint8)
@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# 大画布模式：将画布切分为固定大小的块（tile），块数据存放在内存映射文件中，
+# 只有被图元实际触及的块才会被分配，输出时按块带（一行块）流式写出BMP
+import os
+import struct
+import tempfile
+import numpy as np
+from PIL import Image
+
+DEFAULT_TILE_SIZE = 256   # 默认块边长（像素）
+INITIAL_CAPACITY = 64     # 内存映射文件初始可容纳的块数，不足时按倍数扩容
+
+
+class TiledCanvas:
+    """分块画布，接口按图像坐标（行、列）读写像素
+
+    未被触及的块不占用存储，读出时视为背景色
+    """
+    def __init__(self, width: int, height: int, tile_size: int = DEFAULT_TILE_SIZE,
+                 background: int = 255, path: str = None):
+        if width <= 0 or height <= 0:
+            raise ValueError("画布宽高必须为正数")
+        if tile_size <= 0:
+            raise ValueError("块大小必须为正数")
+        self.width = width
+        self.height = height
+        self.tile_size = tile_size
+        self.background = background
+        self.tiles_x = (width + tile_size - 1) // tile_size
+        self.tiles_y = (height + tile_size - 1) // tile_size
+        # 块坐标(tx, ty) -> 内存映射文件中的槽位
+        self._slots = {}
+        self._capacity = 0
+        self._store = None
+        # 未指定路径时使用临时文件，关闭画布时删除
+        if path is None:
+            fd, path = tempfile.mkstemp(suffix='.tiles')
+            os.close(fd)
+            self._owns_file = True
+        else:
+            open(path, 'wb').close()
+            self._owns_file = False
+        self.path = path
+        self._grow(INITIAL_CAPACITY)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def tile_count(self) -> int:
+        """已分配的块数"""
+        return len(self._slots)
+
+    @property
+    def nbytes(self) -> int:
+        """块存储映射的字节数"""
+        return self._capacity * self.tile_size * self.tile_size * 3
+
+    def _grow(self, capacity: int):
+        """扩容内存映射文件（先释放旧映射再截断文件，兼容Windows）"""
+        if self._store is not None:
+            self._store.flush()
+            self._store = None
+        tile_bytes = self.tile_size * self.tile_size * 3
+        with open(self.path, 'r+b') as fp:
+            fp.truncate(capacity * tile_bytes)
+        self._store = np.memmap(self.path, dtype=np.uint8, mode='r+',
+                                shape=(capacity, self.tile_size, self.tile_size, 3))
+        self._capacity = capacity
+
+    def _tile(self, tx: int, ty: int) -> np.ndarray:
+        """取得块(tx, ty)的存储视图，首次访问时分配并填充背景色"""
+        slot = self._slots.get((tx, ty))
+        if slot is None:
+            slot = len(self._slots)
+            if slot >= self._capacity:
+                self._grow(self._capacity * 2)
+            self._slots[(tx, ty)] = slot
+            self._store[slot].fill(self.background)
+        return self._store[slot]
+
+    def draw_pixels(self, rows, cols, color):
+        """按包围盒把像素分派到各块中写入，超出画布的像素被丢弃
+
+        :param rows: (array of int) 像素的图像行坐标
+        :param cols: (array of int) 像素的图像列坐标
+        :param color: (array of uint8: [R, G, B]) 颜色
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        inside = (rows >= 0) & (rows < self.height) & (cols >= 0) & (cols < self.width)
+        if not inside.all():
+            rows = rows[inside]
+            cols = cols[inside]
+        if rows.size == 0:
+            return
+        size = self.tile_size
+        # 由包围盒确定候选块范围，图元只落在单个块内时直接写入
+        tx0, tx1 = cols.min() // size, cols.max() // size
+        ty0, ty1 = rows.min() // size, rows.max() // size
+        if tx0 == tx1 and ty0 == ty1:
+            self._tile(tx0, ty0)[rows - ty0 * size, cols - tx0 * size] = color
+            return
+        # 跨越多个块时按块编号分组
+        keys = (rows // size) * self.tiles_x + cols // size
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        rows = rows[order]
+        cols = cols[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        ends = np.r_[starts[1:], keys.size]
+        for start, end in zip(starts, ends):
+            ty, tx = divmod(int(keys[start]), self.tiles_x)
+            self._tile(tx, ty)[rows[start:end] - ty * size, cols[start:end] - tx * size] = color
+
+    def tile_shape(self, tx: int, ty: int):
+        """块(tx, ty)在画布内的有效高宽（边缘块可能不满）"""
+        size = self.tile_size
+        return min(size, self.height - ty * size), min(size, self.width - tx * size)
+
+    def read_tile(self, tx: int, ty: int) -> np.ndarray:
+        """读出块(tx, ty)的有效区域，未分配的块返回背景色"""
+        h, w = self.tile_shape(tx, ty)
+        slot = self._slots.get((tx, ty))
+        if slot is None:
+            return np.full((h, w, 3), self.background, np.uint8)
+        return np.array(self._store[slot, :h, :w])
+
+    def read_band(self, ty: int) -> np.ndarray:
+        """读出第ty行块拼成的横条（高为块高，宽为画布宽）"""
+        size = self.tile_size
+        h = min(size, self.height - ty * size)
+        band = np.full((h, self.width, 3), self.background, np.uint8)
+        for tx in range(self.tiles_x):
+            slot = self._slots.get((tx, ty))
+            if slot is not None:
+                w = min(size, self.width - tx * size)
+                band[:, tx * size:tx * size + w] = self._store[slot, :h, :w]
+        return band
+
+    def save_bmp(self, path: str):
+        """以24位BMP格式流式写出整张画布，每次只在内存中保留一行块
+
+        BMP头中的文件大小字段只有32位，超过4GB时写0（多数读取器会忽略该字段）
+        """
+        row_bytes = self.width * 3
+        stride = (row_bytes + 3) & ~3  # 每行按4字节对齐
+        image_size = stride * self.height
+        file_size = 14 + 40 + image_size
+        if file_size > 0xFFFFFFFF:
+            file_size = 0
+            image_size = 0
+        with open(path, 'wb') as fp:
+            fp.write(struct.pack('<2sIHHI', b'BM', file_size, 0, 0, 14 + 40))
+            fp.write(struct.pack('<IiiHHIIiiII', 40, self.width, self.height, 1, 24, 0,
+                                 image_size, 2835, 2835, 0, 0))
+            # BMP从最下面一行开始存储，颜色顺序为BGR
+            for ty in range(self.tiles_y - 1, -1, -1):
+                band = self.read_band(ty)
+                buf = np.zeros((band.shape[0], stride), np.uint8)
+                buf[:, :row_bytes] = band[::-1, :, ::-1].reshape(band.shape[0], row_bytes)
+                fp.write(buf.tobytes())
+
+    def save_tiles(self, output_dir: str, name: str):
+        """把每个已分配的块单独保存为 name_ty_tx.bmp，未触及的块全为背景色，不输出"""
+        os.makedirs(output_dir, exist_ok=True)
+        for tx, ty in sorted(self._slots, key=lambda k: (k[1], k[0])):
+            tile = self.read_tile(tx, ty)
+            Image.fromarray(tile).save(os.path.join(output_dir, f'{name}_{ty}_{tx}.bmp'), 'bmp')
+
+    def close(self):
+        """释放内存映射，删除临时文件"""
+        if self._store is not None:
+            self._store.flush()
+            self._store = None
+        if self._owns_file and os.path.exists(self.path):
+            os.remove(self.path)
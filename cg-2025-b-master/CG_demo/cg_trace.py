@@ -0,0 +1,280 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# GUI交互轨迹的录制与回放：录制MainWindow中画布上的鼠标事件、按钮和菜单操作，
+# 在offscreen平台上无界面回放，统计每个事件的处理耗时、画布绘制耗时和输入到画面的延迟
+#
+#   python cg_gui.py --record session.jsonl          录制（正常使用界面，关闭窗口时写完）
+#   python cg_trace.py session.jsonl --output report.json [--fast]
+#
+# 轨迹文件为JSON Lines：第一行是窗口和画布的初始状态，之后每行一个事件，t为距开始录制的秒数。
+# 鼠标位置同时保存视口坐标和场景坐标，回放时按场景坐标换算，与窗口大小无关；
+# 会打开模态对话框的操作只录制对话框的结果（颜色、画布尺寸、打开的文件），导出画布不录制
+import sys
+import os
+import json
+import time
+import argparse
+import numpy as np
+from PyQt5.QtWidgets import QApplication, QAction
+from PyQt5.QtGui import QMouseEvent, QWheelEvent
+from PyQt5.QtCore import Qt, QObject, QEvent, QEventLoop, QPoint, QPointF
+import cg_gui
+
+TRACE_VERSION = 1
+# 录制的按钮（MainWindow的属性名），点击时同时保存ID输入框和算法下拉框的内容
+RECORDED_BUTTONS = ('line_btn', 'poly_btn', 'ellipse_btn', 'curve_btn',
+                    'translate_btn', 'rotate_btn', 'scale_btn')
+FORM_FIELDS = ('line_alg', 'poly_alg', 'curve_alg')
+# 录制的菜单项（按文字匹配）
+RECORDED_ACTIONS = ('撤销', '重做', '删除选中图元', '光栅合成模式', '重置缩放')
+PERCENTILES = (50, 90, 99)
+MOUSE_EVENTS = {QEvent.MouseButtonPress: 'mouse_press', QEvent.MouseButtonRelease: 'mouse_release',
+                QEvent.MouseButtonDblClick: 'mouse_double_click', QEvent.MouseMove: 'mouse_move',
+                QEvent.Wheel: 'wheel'}
+
+
+class MouseFilter(QObject):
+    """视口事件过滤器：只记录鼠标事件，不拦截"""
+    def __init__(self, recorder: 'TraceRecorder'):
+        super().__init__(recorder.canvas)
+        self.recorder = recorder
+
+    def eventFilter(self, obj, event) -> bool:
+        if event.type() in MOUSE_EVENTS:
+            self.recorder.record_mouse(event)
+        return False
+
+
+class TraceRecorder:
+    """把MainWindow的交互写入轨迹文件"""
+    def __init__(self, window: 'cg_gui.MainWindow', path: str):
+        self.window = window
+        self.canvas = window.canvas
+        self.fp = open(path, 'w')
+        self.start = time.perf_counter()
+        self.depth = 0  # 正在执行的已录制画布调用层数，内部嵌套调用不重复录制
+        rect = self.canvas.sceneRect()
+        self.write({'version': TRACE_VERSION,
+                    'window': [window.width(), window.height()],
+                    'scene_rect': [rect.width(), rect.height()],
+                    'raster_mode': self.canvas.raster_mode,
+                    'zoom': self.canvas.zoom})
+
+        # 画布视口上的鼠标事件
+        self.filter = MouseFilter(self)
+        self.canvas.viewport().installEventFilter(self.filter)
+        # 按钮和菜单项
+        for name in RECORDED_BUTTONS:
+            getattr(window, name).clicked.connect(lambda checked=False, name=name: self.record_button(name))
+        for action in window.findChildren(QAction):
+            if action.text() in RECORDED_ACTIONS:
+                action.triggered.connect(lambda checked=False, action=action: self.write(
+                    {'kind': 'action', 'text': action.text(), 'checked': action.isChecked()}))
+        # 对话框的结果：包装实例上的方法，界面代码通过属性调用它们
+        self.wrap(self.canvas, 'set_color', lambda color: {'kind': 'color', 'color': list(color)})
+        self.wrap(self.canvas, 'reset_canvas', lambda width, height: {'kind': 'reset', 'size': [width, height]})
+        self.wrap(self.canvas, 'load_scene', lambda path: {'kind': 'load_scene', 'path': os.path.abspath(path)})
+        self.wrap(window, 'open_command_file', lambda path: {'kind': 'open_commands', 'path': os.path.abspath(path)})
+
+    def now(self) -> float:
+        return time.perf_counter() - self.start
+
+    def write(self, event: dict):
+        if 'version' not in event:
+            event['t'] = round(self.now(), 6)
+        self.fp.write(json.dumps(event, ensure_ascii=False) + '\n')
+
+    def wrap(self, obj, name, describe):
+        """录制obj.name的顶层调用（加载指令文件期间画布内部的调用不录制）"""
+        method = getattr(obj, name)
+
+        def wrapper(*args):
+            if self.depth == 0 and self.canvas.loader is None:
+                self.write(describe(*args))
+            self.depth += 1
+            try:
+                return method(*args)
+            finally:
+                self.depth -= 1
+        setattr(obj, name, wrapper)
+
+    def record_button(self, name: str):
+        window = self.window
+        self.write({'kind': 'button', 'name': name, 'id': window.id_input.text(),
+                    'form': {field: getattr(window, field).currentText() for field in FORM_FIELDS}})
+
+    def record_mouse(self, event):
+        pos = event.pos()
+        scene = self.canvas.mapToScene(pos)
+        record = {'kind': 'mouse', 'type': int(event.type()), 'pos': [pos.x(), pos.y()],
+                  'scene': [scene.x(), scene.y()], 'buttons': int(event.buttons()),
+                  'modifiers': int(event.modifiers())}
+        if event.type() == QEvent.Wheel:
+            record['delta'] = [event.angleDelta().x(), event.angleDelta().y()]
+        else:
+            record['button'] = int(event.button())
+        self.write(record)
+
+    def close(self):
+        self.canvas.viewport().removeEventFilter(self.filter)
+        self.fp.close()
+
+
+def percentiles(values) -> dict:
+    """毫秒为单位的分位数统计"""
+    if not values:
+        return {'count': 0}
+    ms = np.array(values) * 1000
+    stats = {'count': len(values), 'mean': float(ms.mean()), 'max': float(ms.max())}
+    for p in PERCENTILES:
+        stats[f'p{p}'] = float(np.percentile(ms, p))
+    return stats
+
+
+class TraceReplayer:
+    """在新的MainWindow上回放轨迹并计时"""
+    def __init__(self, path: str, realtime: bool = True):
+        """
+        :param path: (string) 轨迹文件
+        :param realtime: (bool) 是否按录制时的时间间隔回放；为False时事件之间只处理已排队的事件
+        """
+        with open(path) as fp:
+            lines = [json.loads(line) for line in fp if line.strip()]
+        self.header, self.events = lines[0], lines[1:]
+        if self.header.get('version') != TRACE_VERSION:
+            raise ValueError(f"不支持的轨迹版本：{self.header.get('version')}")
+        self.realtime = realtime
+        self.event_times = {}   # 事件类别 -> [处理耗时]
+        self.paint_times = []   # 每次画布绘制的耗时
+        self.latencies = []     # 输入事件到其后第一次绘制完成的时间
+        self.pending = []       # 尚未出现绘制的输入事件的开始时间
+        self.no_frame = 0       # 下一个事件到来前没有引起重绘的事件数
+        self.window = None      # 回放用的窗口，回放结束后可用于检查最终状态
+
+    def on_paint(self, start: float, end: float):
+        self.paint_times.append(end - start)
+        for event_start in self.pending:
+            self.latencies.append(end - event_start)
+        self.pending = []
+
+    def run(self) -> dict:
+        app = QApplication.instance() or QApplication(sys.argv[:1])
+        window = self.window = cg_gui.MainWindow()
+        window.resize(*self.header['window'])
+        window.show()
+        canvas = window.canvas
+        width, height = self.header['scene_rect']
+        canvas.reset_canvas(int(width), int(height))
+        canvas.set_raster_mode(self.header['raster_mode'])
+        canvas.set_zoom(self.header['zoom'])
+        app.processEvents()
+        actions = {action.text(): action for action in window.findChildren(QAction)}
+        canvas.paint_listener = self.on_paint
+
+        replay_start = time.perf_counter()
+        for event in self.events:
+            if self.realtime:
+                # 等到录制时的时刻，期间照常处理定时器和重绘
+                while time.perf_counter() - replay_start < event['t']:
+                    app.processEvents(QEventLoop.AllEvents, 1)
+            self.no_frame += len(self.pending)
+            self.pending = []
+            start = time.perf_counter()
+            self.dispatch(event, window, actions)
+            end = time.perf_counter()
+            kind = event['kind'] if event['kind'] != 'mouse' else MOUSE_EVENTS.get(event['type'], 'mouse')
+            self.event_times.setdefault(kind, []).append(end - start)
+            self.pending.append(start)
+            app.processEvents()
+            # 打开指令文件时等待加载完成
+            while canvas.loader is not None:
+                app.processEvents()
+        app.processEvents()
+        canvas.paint_listener = None
+        total = time.perf_counter() - replay_start
+        window.close()
+        return self.report(total, len(canvas.item_dict))
+
+    def dispatch(self, event: dict, window, actions: dict):
+        """把一条轨迹事件交给窗口处理"""
+        canvas = window.canvas
+        kind = event['kind']
+        if kind == 'mouse':
+            pos = QPointF(canvas.mapFromScene(QPointF(*event['scene'])))
+            modifiers = Qt.KeyboardModifiers(event['modifiers'])
+            buttons = Qt.MouseButtons(event['buttons'])
+            if event['type'] == QEvent.Wheel:
+                qt_event = QWheelEvent(pos, QPointF(canvas.viewport().mapToGlobal(pos.toPoint())), QPoint(),
+                                       QPoint(*event['delta']), buttons, modifiers, Qt.NoScrollPhase, False)
+            else:
+                qt_event = QMouseEvent(QEvent.Type(event['type']), pos, Qt.MouseButton(event['button']),
+                                       buttons, modifiers)
+            QApplication.sendEvent(canvas.viewport(), qt_event)
+        elif kind == 'button':
+            window.id_input.setText(event['id'])
+            for field, text in event['form'].items():
+                getattr(window, field).setCurrentText(text)
+            getattr(window, event['name']).click()
+        elif kind == 'action':
+            action = actions[event['text']]
+            if action.isCheckable():
+                action.setChecked(event['checked'])
+            else:
+                action.trigger()
+        elif kind == 'color':
+            canvas.set_color(tuple(event['color']))
+        elif kind == 'reset':
+            canvas.cancel_loading()
+            canvas.reset_canvas(*event['size'])
+        elif kind == 'load_scene':
+            canvas.load_scene(event['path'])
+        elif kind == 'open_commands':
+            window.open_command_file(event['path'])
+
+    def report(self, total: float, item_count: int) -> dict:
+        all_events = [seconds for times in self.event_times.values() for seconds in times]
+        return {
+            'events': len(self.events),
+            'items': item_count,
+            'replay_seconds': total,
+            'realtime': self.realtime,
+            'event_ms': percentiles(all_events),
+            'event_ms_by_kind': {kind: percentiles(times) for kind, times in sorted(self.event_times.items())},
+            'paint_ms': percentiles(self.paint_times),
+            'frame_latency_ms': percentiles(self.latencies),
+            'events_without_frame': self.no_frame + len(self.pending),
+        }
+
+
+def format_report(report: dict) -> str:
+    """可读的回放结果"""
+    def row(name, stats):
+        if not stats.get('count'):
+            return f"{name:22s}{0:8d}"
+        return (f"{name:22s}{stats['count']:8d}" + ''.join(f"{stats[f'p{p}']:10.2f}" for p in PERCENTILES)
+                + f"{stats['max']:10.2f}")
+    lines = [f"回放 {report['events']} 个事件，用时 {report['replay_seconds']:.2f}s，结束时 {report['items']} 个图元",
+             f"{'(ms)':22s}{'次数':>6s}" + ''.join(f"{f'p{p}':>10s}" for p in PERCENTILES) + f"{'max':>10s}",
+             row('事件处理', report['event_ms'])]
+    for kind, stats in report['event_ms_by_kind'].items():
+        lines.append(row('  ' + kind, stats))
+    lines.append(row('画布绘制', report['paint_ms']))
+    lines.append(row('输入到画面', report['frame_latency_ms']))
+    lines.append(f"未引起重绘的事件 {report['events_without_frame']} 个")
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='在offscreen平台上回放GUI交互轨迹并统计帧时间')
+    parser.add_argument('trace', help='cg_gui.py --record 录制的轨迹文件')
+    parser.add_argument('--fast', action='store_true', help='不按录制时的时间间隔等待，尽快回放')
+    parser.add_argument('--output', help='JSON结果路径')
+    args = parser.parse_args(sys.argv[1:])
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+    result = TraceReplayer(args.trace, realtime=not args.fast).run()
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(result, fp, ensure_ascii=False, indent=2)
+    print(format_report(result))
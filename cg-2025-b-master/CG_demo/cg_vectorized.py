@@ -0,0 +1,360 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# cg_algorithms的NumPy向量化实现，接口与cg_algorithms相同，输出的像素点集合与之逐点一致：
+#   - 绘制函数返回 (N, 2) 的int64数组而不是列表，点的顺序也与cg_algorithms相同
+#   - 浮点运算按cg_algorithms的运算顺序逐元素进行（DDA用累加而不是乘法），
+#     四舍五入用np.rint，与Python的round同为“四舍六入五成双”
+#   - 像素很少的线段、多边形和椭圆向量化得不偿失，直接调用cg_algorithms后转换为数组
+#   - 变换函数返回列表；控制点很少时同样直接调用cg_algorithms
+#   - 裁剪只处理两个端点，没有可以向量化的部分，直接调用cg_algorithms
+import math
+import numpy as np
+import cg_algorithms as alg
+
+MIN_VECTOR_PIXELS = 16   # 像素数少于该值的线段和多边形直接调用cg_algorithms
+MIN_VECTOR_ELLIPSE = 320  # 椭圆的固定开销较大，估计像素数 4(a + b) 少于该值时直接调用cg_algorithms
+MIN_VECTOR_POINTS = 32   # 控制点数少于该值的变换直接调用cg_algorithms
+MAX_ELLIPSE_AXIS = 30000  # 半轴超过该值时决策变量可能超出int64，椭圆改用cg_algorithms
+
+clip = alg.clip
+
+
+def _empty():
+    return np.zeros((0, 2), np.int64)
+
+
+def _as_array(pixels):
+    """cg_algorithms的结果转换为 (N, 2) 数组"""
+    return np.array(pixels, np.int64).reshape(-1, 2)
+
+
+def _bresenham_line(x0, y0, x1, y1):
+    """单条线段的Bresenham算法，偏移量的计算与_bresenham相同"""
+    dx, dy = x1 - x0, y1 - y0
+    dx_abs, dy_abs = abs(dx), abs(dy)
+    x_step = 1 if dx > 0 else -1 if dx < 0 else 0
+    y_step = 1 if dy > 0 else -1 if dy < 0 else 0
+    i = np.arange(max(dx_abs, dy_abs) + 1, dtype=np.int64)
+    result = np.empty((len(i), 2), np.int64)
+    if dx_abs > dy_abs:
+        result[:, 0] = x0 + x_step * i
+        result[:, 1] = y0 + y_step * ((2 * dy_abs * i + dx_abs) // (2 * dx_abs))
+    else:
+        result[:, 0] = x0 + x_step * ((2 * dx_abs * i + dy_abs) // max(2 * dy_abs, 1))
+        result[:, 1] = y0 + y_step * i
+    return result
+
+
+def _bresenham(starts, ends):
+    """同时光栅化多条线段的Bresenham算法
+
+    第i步的副方向偏移为 floor((2·i·d_minor + d_major) / (2·d_major))，与逐步更新决策变量的结果相同
+
+    :param starts: (numpy.ndarray) (M, 2) 起点
+    :param ends: (numpy.ndarray) (M, 2) 终点
+    :return: (numpy.ndarray) (N, 2) 各线段的像素点依次相连
+    """
+    delta = ends - starts
+    step = np.sign(delta)
+    dx, dy = np.abs(delta).T
+    x_major = dx > dy
+    major = np.where(x_major, dx, dy)
+    minor = np.where(x_major, dy, dx)
+    counts = major + 1
+    # 每个像素在所属线段中的步数 i
+    segment = np.repeat(np.arange(len(starts)), counts)
+    i = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    major, minor = major[segment], minor[segment]
+    offset = (2 * i * minor + major) // np.maximum(2 * major, 1)
+    x_major = x_major[segment]
+    result = np.empty((len(i), 2), np.int64)
+    result[:, 0] = starts[segment, 0] + step[segment, 0] * np.where(x_major, i, offset)
+    result[:, 1] = starts[segment, 1] + step[segment, 1] * np.where(x_major, offset, i)
+    return result
+
+
+def _dda(x0, y0, x1, y1):
+    """单条线段的DDA算法，坐标由起点依次累加增量得到（np.cumsum按顺序累加），与逐步累加的舍入误差相同"""
+    dx = x1 - x0
+    dy = y1 - y0
+    steps = max(abs(dx), abs(dy))
+    if steps == 0:
+        return np.array([[x0, y0]], np.int64)
+    xs = np.full(steps + 1, dx / steps)
+    ys = np.full(steps + 1, dy / steps)
+    xs[0] = x0
+    ys[0] = y0
+    return np.rint(np.stack([np.cumsum(xs), np.cumsum(ys)], axis=1)).astype(np.int64)
+
+
+def _naive(x0, y0, x1, y1):
+    if x0 == x1:
+        ys = np.arange(y0, y1 + 1)
+        return np.stack([np.full(len(ys), x0), ys], axis=1).astype(np.int64)
+    if x0 > x1:
+        x0, y0, x1, y1 = x1, y1, x0, y0
+    k = (y1 - y0) / (x1 - x0)
+    xs = np.arange(x0, x1 + 1)
+    # int()向零取整
+    return np.stack([xs, np.trunc(y0 + k * (xs - x0)).astype(np.int64)], axis=1)
+
+
+def draw_line(p_list, algorithm):
+    """绘制线段
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1]]) 线段的起点和终点坐标
+    :param algorithm: (string) 绘制使用的算法，包括'DDA'、'Bresenham'和'Naive'
+    :return: (numpy.ndarray) (N, 2) 绘制结果的像素点坐标
+    """
+    (x0, y0), (x1, y1) = p_list
+    if max(abs(x1 - x0), abs(y1 - y0)) < MIN_VECTOR_PIXELS:
+        return _as_array(alg.draw_line(p_list, algorithm))
+    if algorithm == 'Bresenham':
+        return _bresenham_line(x0, y0, x1, y1)
+    elif algorithm == 'DDA':
+        return _dda(x0, y0, x1, y1)
+    elif algorithm == 'Naive':
+        return _naive(x0, y0, x1, y1)
+    return _empty()
+
+
+def draw_polygon(p_list, algorithm):
+    """绘制多边形，Bresenham一次光栅化全部边，其他算法逐边光栅化
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1], [x2, y2], ...]) 多边形的顶点坐标列表
+    :param algorithm: (string) 绘制使用的算法，包括'DDA'和'Bresenham'
+    :return: (numpy.ndarray) (N, 2) 绘制结果的像素点坐标
+    """
+    if not p_list:
+        return _empty()
+    perimeter = sum(max(abs(x1 - x0), abs(y1 - y0)) for (x0, y0), (x1, y1) in zip(p_list, p_list[1:]))
+    if perimeter < MIN_VECTOR_PIXELS:
+        return _as_array(alg.draw_polygon(p_list, algorithm))
+    if algorithm == 'Bresenham':
+        points = np.array(p_list, np.int64).reshape(-1, 2)
+        return _bresenham(np.roll(points, 1, axis=0), points)
+    lines = [draw_line([p_list[i - 1], p_list[i]], algorithm) for i in range(len(p_list))]
+    return np.concatenate(lines)
+
+
+def _ellipse_region1(a, b):
+    """区域1中每个x对应的y，以及区域2的起点
+
+    cg_algorithms在(x, y)处的决策变量只与x、y有关：
+        d1 = b² + ⌊a²/4⌋ + b²x² + b²x - a²b² + a²y² - a²y
+    d1 < 0时y不变，否则y减1。记T(x)为使x处d1 < 0的最大y，只要y每步最多减1，
+    x+1处的y就是 min(b, T(0), ..., T(x))；从第一次减少超过1的位置开始改为逐步递推
+    """
+    a_sq, b_sq = a * a, b * b
+    xs = np.arange(a + 1, dtype=np.int64)
+    # d1 < 0 ⇔ a²(y² - y) < rest
+    rest = a_sq * b_sq - b_sq - a_sq // 4 - b_sq * xs * (xs + 1)
+    t = np.floor((1 + np.sqrt(np.maximum(1 + 4 * rest / a_sq, 0))) / 2).astype(np.int64)
+    # 浮点开方的误差用精确的整数比较修正，不存在满足条件的y时记为-1
+    for _ in range(2):
+        t -= (a_sq * (t * t - t) >= rest) & (t > 0)
+        t += a_sq * ((t + 1) * (t + 1) - (t + 1)) < rest
+    t = np.where(a_sq * (t * t - t) < rest, t, -1)
+    ys = np.empty(a + 1, np.int64)
+    ys[0] = b
+    ys[1:] = np.minimum(b, np.minimum.accumulate(t[:-1]))
+    # 区域1在 b²x > a²y 时结束
+    stop = np.flatnonzero(b_sq * xs > a_sq * ys)
+    stop = stop[0] if len(stop) else a + 1
+    jumps = np.flatnonzero(np.diff(ys[:stop + 1]) < -1)
+    if len(jumps) == 0 and stop <= a:
+        return xs[:stop], ys[:stop], (stop, int(ys[stop]))
+    # 逐步递推剩余部分
+    k = int(jumps[0]) if len(jumps) else a
+    x, y = k, int(ys[k])
+    tail_x, tail_y = [], []
+    while b_sq * x <= a_sq * y:
+        tail_x.append(x)
+        tail_y.append(y)
+        if b_sq + a_sq // 4 + b_sq * x * x + b_sq * x - a_sq * b_sq + a_sq * y * y - a_sq * y >= 0:
+            y -= 1
+        x += 1
+    return (np.concatenate([xs[:k], np.array(tail_x, np.int64)]),
+            np.concatenate([ys[:k], np.array(tail_y, np.int64)]), (x, y))
+
+
+def _ellipse_region2(a, b, x0, y0):
+    """区域2中每个y（从y0递减到0）对应的x
+
+    以区域2起点的决策变量d0为基准，(x, y)处的决策变量为
+        d2 = d0 + b²(x² + x - x0² - x0) + a²(2(y0 - y) - y0(y0 + 1) + y(y + 1))
+    d2 > 0时x不变，否则x加1。记V(y)为使y处d2 <= 0的最大x，只要x每步最多加1，
+    y-1处的x就是 max(x0, V(y0) + 1, ..., V(y) + 1)；从第一次增加超过1的位置开始改为逐步递推
+    """
+    a_sq, b_sq = a * a, b * b
+    d0 = int(round(b_sq * (x0 + 0.5) ** 2 + a_sq * (y0 - 1) ** 2 - a_sq * b_sq))
+    ys = np.arange(y0, -1, -1, dtype=np.int64)
+    if len(ys) == 0:
+        return ys, ys
+    # d2 <= 0 ⇔ b²(x² + x) <= rest
+    rest = b_sq * (x0 * x0 + x0) - d0 - a_sq * (2 * (y0 - ys) - y0 * (y0 + 1) + ys * (ys + 1))
+    v = np.floor((-1 + np.sqrt(np.maximum(1 + 4 * rest / b_sq, 0))) / 2).astype(np.int64)
+    for _ in range(2):
+        v -= (b_sq * (v * v + v) > rest) & (v > 0)
+        v += b_sq * ((v + 1) * (v + 1) + (v + 1)) <= rest
+    v = np.where(b_sq * (v * v + v) <= rest, v, -1)
+    xs = np.empty(len(ys), np.int64)
+    xs[0] = x0
+    xs[1:] = np.maximum(x0, np.maximum.accumulate(v[:-1] + 1))
+    jumps = np.flatnonzero(np.diff(xs) > 1)
+    if len(jumps) == 0:
+        return xs, ys
+    # 逐步递推剩余部分
+    k = int(jumps[0])
+    x = int(xs[k])
+    tail = []
+    for y in range(int(ys[k]), -1, -1):
+        tail.append(x)
+        if d0 + b_sq * (x * x + x - x0 * x0 - x0) + a_sq * (2 * (y0 - y) - y0 * (y0 + 1) + y * (y + 1)) <= 0:
+            x += 1
+    xs[k:] = tail
+    return xs, ys
+
+
+def draw_ellipse(p_list):
+    """绘制椭圆（中点椭圆算法，区域1、2中每个点的坐标由决策变量的闭式解直接求出）
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1]]) 椭圆的矩形包围框左上角和右下角顶点坐标
+    :return: (numpy.ndarray) (N, 2) 绘制结果的像素点坐标，已去重并按(x, y)排序
+    """
+    (x0, y0), (x1, y1) = p_list
+    center_x = (x0 + x1) // 2
+    center_y = (y0 + y1) // 2
+    a = abs(x1 - x0) // 2
+    b = abs(y1 - y0) // 2
+    if a == 0 and b == 0:
+        return np.array([[center_x, center_y]], np.int64)
+    if a == 0:
+        ys = np.arange(min(y0, y1), max(y0, y1) + 1)
+        return np.stack([np.full(len(ys), center_x), ys], axis=1).astype(np.int64)
+    if b == 0:
+        xs = np.arange(min(x0, x1), max(x0, x1) + 1)
+        return np.stack([xs, np.full(len(xs), center_y)], axis=1).astype(np.int64)
+    if 4 * (a + b) < MIN_VECTOR_ELLIPSE or max(a, b) > MAX_ELLIPSE_AXIS:
+        return _as_array(alg.draw_ellipse(p_list))
+    xs1, ys1, (x_start, y_start) = _ellipse_region1(a, b)
+    xs2, ys2 = _ellipse_region2(a, b, x_start, y_start)
+    xs = np.concatenate([xs1, xs2])
+    ys = np.concatenate([ys1, ys2])
+    # 四个象限的对称点，编码为一维键后去重排序，顺序与按(x, y)排序相同
+    px = np.concatenate([center_x + xs, center_x - xs, center_x + xs, center_x - xs])
+    py = np.concatenate([center_y + ys, center_y + ys, center_y - ys, center_y - ys])
+    x_min, y_min = px.min(), py.min()
+    span = py.max() - y_min + 1
+    keys = np.sort((px - x_min) * span + (py - y_min))
+    keys = keys[np.concatenate([[True], keys[1:] != keys[:-1]])]
+    return np.stack([keys // span + x_min, keys % span + y_min], axis=1)
+
+
+def _bezier(points, num_points_per_segment):
+    """De Casteljau算法，同时计算全部采样点"""
+    t = np.arange(num_points_per_segment + 1) / num_points_per_segment
+    # (控制点, 采样点, 坐标)
+    p = np.repeat(points[:, None, :], len(t), axis=1)
+    s = 1 - t
+    for k in range(1, len(points)):
+        # 同一层中points[i]用到的points[i + 1]仍是上一层的值
+        p[:-k] = s[:, None] * p[:-k] + t[:, None] * p[1:len(points) - k + 1]
+    return p[0]
+
+
+def _bspline(points, num_points_per_segment):
+    """三次B样条，按cg_algorithms的递推顺序（j递增，使用本层已更新的p[j - 1]）同时计算全部采样点"""
+    n = len(points)
+    k = 3
+    m = n + k + 1
+    u = np.array([0.0 if i < k + 1 else 1.0 if i > n else (i - k) / (n - k) for i in range(m)])
+    total_points = num_points_per_segment * (n - k)
+    t = u[k] + (u[n] - u[k]) * (np.arange(total_points + 1) / total_points)
+    # 节点区间[u_d, u_{d+1})，t等于最后一个节点时取最后一个区间
+    d = np.clip(np.searchsorted(u, t, side='right') - 1, k, n - 1)
+    p = points[d[:, None] - k + np.arange(k + 1)]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for r in range(1, k + 1):
+            for j in range(r, k + 1):
+                u_j = u[d - k + j]
+                u_jkr = u[d - k + j + k - r + 1]
+                alpha = np.where(u_jkr == u_j, 0.0, (t - u_j) / (u_jkr - u_j))[:, None]
+                p[:, j] = (1 - alpha) * p[:, j - 1] + alpha * p[:, j]
+    return p[:, k]
+
+
+def draw_curve(p_list, algorithm, num_points_per_segment=50):
+    """绘制曲线
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1], [x2, y2], ...]) 曲线的控制点坐标列表
+    :param algorithm: (string) 绘制使用的算法，包括'Bezier'和'B-spline'
+    :param num_points_per_segment: (int) 每段曲线的采样点数（控制曲线平滑度）
+    :return: (numpy.ndarray) (N, 2) 绘制结果的像素点坐标
+    """
+    n = len(p_list)
+    if algorithm == 'Bezier':
+        if n < 2:
+            raise ValueError("Bezier曲线至少需要2个控制点")
+    elif algorithm == 'B-spline':
+        if n < 4:
+            raise ValueError("B-spline曲线至少需要4个控制点")
+    else:
+        raise ValueError("未知的曲线算法")
+    points = np.array(p_list, np.float64).reshape(-1, 2)
+    if algorithm == 'Bezier':
+        curve = _bezier(points, num_points_per_segment)
+    else:
+        curve = _bspline(points, num_points_per_segment)
+    return np.rint(curve).astype(np.int64)
+
+
+def translate(p_list, dx, dy):
+    """平移变换
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1], [x2, y2], ...]) 图元参数
+    :param dx: (int) 水平方向平移量
+    :param dy: (int) 垂直方向平移量
+    :return: (list of list of int: [[x_0, y_0], [x_1, y_1], [x_2, y_2], ...]) 变换后的图元参数
+    """
+    if len(p_list) < MIN_VECTOR_POINTS:
+        return alg.translate(p_list, dx, dy)
+    return (np.array(p_list, np.int64) + [dx, dy]).tolist()
+
+
+def rotate(p_list, x, y, r):
+    """旋转变换（除椭圆外）
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1], [x2, y2], ...]) 图元参数
+    :param x: (int) 旋转中心x坐标
+    :param y: (int) 旋转中心y坐标
+    :param r: (int) 顺时针旋转角度（°）
+    :return: (list of list of int: [[x_0, y_0], [x_1, y_1], [x_2, y_2], ...]) 变换后的图元参数
+    """
+    if len(p_list) < MIN_VECTOR_POINTS:
+        return alg.rotate(p_list, x, y, r)
+    angle_rad = math.radians(r)
+    cos_theta = math.cos(angle_rad)
+    sin_theta = math.sin(angle_rad)
+    points = np.array(p_list, np.int64)
+    x_rel = points[:, 0] - x
+    y_rel = points[:, 1] - y
+    x_new = x_rel * cos_theta + y_rel * sin_theta + x
+    y_new = -x_rel * sin_theta + y_rel * cos_theta + y
+    return np.rint(np.stack([x_new, y_new], axis=1)).astype(np.int64).tolist()
+
+
+def scale(p_list, x, y, s):
+    """缩放变换
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1], [x2, y2], ...]) 图元参数
+    :param x: (int) 缩放中心x坐标
+    :param y: (int) 缩放中心y坐标
+    :param s: (float) 缩放倍数
+    :return: (list of list of int: [[x_0, y_0], [x_1, y_1], [x_2, y_2], ...]) 变换后的图元参数
+    """
+    if len(p_list) < MIN_VECTOR_POINTS:
+        return alg.scale(p_list, x, y, s)
+    points = (np.array(p_list, np.int64) - [x, y]) * s + [x, y]
+    return np.rint(points).astype(np.int64).tolist()